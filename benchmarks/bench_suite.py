@@ -0,0 +1,221 @@
+"""
+Benchmark suite of the editing engine: every navigation motion, selection,
+command dispatch, history growth under 'z', undo/redo and SimpleMimUI rendering, over
+synthetic texts from 30 characters up to hundreds of MB (--sizes).
+
+Results are ns per operation. --save writes them as a JSON baseline,
+--compare reads a baseline and exits with status 1 if any benchmark got
+slower by more than --threshold (a fraction, 0.25 = 25%).
+
+usage: PYTHONPATH=src/mim python benchmarks/bench_suite.py [--sizes 30 1048576 ...]
+           [--filter REGEX] [--save PATH] [--compare PATH] [--threshold 0.25]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import timeit
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from commands import AppCommand, NavigationCommand, SelectionCommand
+from history import CommandHistory
+from main import config_app
+from text_index import TextIndex
+from ui import SimpleMimUI, StreamMimUI
+from util import TextStatus
+
+DEFAULT_SIZES = [30, 1 << 10, 1 << 20, 1 << 24]
+NAVIGATION_COMMANDS = ['0', '$', 'e', 'tx', '3e', '3tx']
+SELECTION_COMMANDS = ['v0', 'v$', 've', 'vtx']
+DISPATCH_COMMANDS = ['0', '$', 'e', 'tx', '12e', 'vtx', 'v3e', 'z', 'bye', 'unknown']
+# distinct positions cycled through by positional benchmarks
+POSITIONS = 1024
+# minimum seconds per timing, see timeit.Timer.autorange
+MIN_SECONDS = 0.2
+
+BASELINE_VERSION = 1
+
+
+def synthetic_text(size: int, seed: int = 7) -> str:
+    """
+    size characters of lowercase words of 1-12 letters separated by single spaces
+    """
+    rnd = random.Random(seed)
+    words = []
+    length = 0
+    while length < min(size, 1 << 16):
+        word = ''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rnd.randint(1, 12)))
+        words.append(word)
+        length += len(word) + 1
+    block = ' '.join(words) + ' '
+    return (block * (size // len(block) + 1))[:size]
+
+
+def time_per_op(operation: Callable[[], None]) -> float:
+    """
+    ns per call of operation, best of three autoranged timings
+    """
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    number = max(number, 1)
+    while True:
+        seconds = min(timer.repeat(repeat=3, number=number))
+        if seconds >= MIN_SECONDS or number >= 1 << 24:
+            return seconds * 1e9 / number
+        number *= 2
+
+
+def cycle(items: List) -> Callable[[], object]:
+    state = [0]
+
+    def next_item():
+        i = state[0]
+        state[0] = (i + 1) % len(items)
+        return items[i]
+    return next_item
+
+
+def statuses(text: str, command_text: str) -> Callable[[], TextStatus]:
+    rnd = random.Random(len(text))
+    positions = [rnd.randrange(len(text)) for _ in range(POSITIONS)]
+    return cycle([TextStatus(text, command_text, pos, pos + 1) for pos in positions])
+
+
+def bench_index(text: str) -> Iterator[Tuple[str, Callable[[], None]]]:
+    yield 'index', lambda: TextIndex(text)
+
+
+def bench_navigation(text: str) -> Iterator[Tuple[str, Callable[[], None]]]:
+    # without the result cache, every call computes the motion
+    command = NavigationCommand(cache_size=0)
+    for command_text in NAVIGATION_COMMANDS:
+        next_status = statuses(text, command_text)
+        yield f'navigation:{command_text}', lambda: command.execute(next_status())
+
+    cached = NavigationCommand()
+    next_status = statuses(text, 'e')
+    yield 'navigation:e:cached', lambda: cached.execute(next_status())
+
+
+def bench_selection(text: str) -> Iterator[Tuple[str, Callable[[], None]]]:
+    command = SelectionCommand(NavigationCommand(cache_size=0))
+    for command_text in SELECTION_COMMANDS:
+        next_status = statuses(text, command_text)
+        yield f'selection:{command_text}', lambda: command.execute(next_status())
+
+
+def bench_dispatch(text: str) -> Iterator[Tuple[str, Callable[[], None]]]:
+    mim_app = config_app(StreamMimUI(io.StringIO(), io.StringIO()))
+    next_command = cycle(DISPATCH_COMMANDS)
+    yield 'dispatch', lambda: mim_app.get_command(next_command())
+
+
+def bench_history(text: str) -> Iterator[Tuple[str, Callable[[], None]]]:
+    history = CommandHistory()
+    command = AppCommand(history)
+    history.append(TextStatus(text, None, 0, 0))
+    next_status = statuses(text, 'e')
+    revert = TextStatus(text, AppCommand.COMMAND_REVERT, 0, 0)
+    redo = TextStatus(text, AppCommand.COMMAND_REDO, 0, 0)
+
+    def push_push_revert():
+        # as in MimApp: two commands pushed, then 'z' moves back in the history
+        history.append(next_status())
+        history.append(next_status())
+        command.execute(revert)
+    yield 'history:push-push-z', push_push_revert
+
+    def revert_redo():
+        command.execute(revert)
+        command.execute(redo)
+    yield 'history:z-Z', revert_redo
+
+
+def bench_render(text: str) -> Iterator[Tuple[str, Callable[[], None]]]:
+    ui = SimpleMimUI()
+    rnd = random.Random(len(text))
+    spans = []
+    for _ in range(POSITIONS):
+        start = rnd.randrange(len(text))
+        spans.append((start, min(len(text), start + rnd.randint(1, 1 << 12))))
+    next_span = cycle(spans)
+
+    def render():
+        start, end = next_span()
+        ui.output_text(text, start, end)
+    yield 'render', render
+
+
+BENCHMARKS = [bench_index, bench_navigation, bench_selection, bench_dispatch, bench_history, bench_render]
+
+
+def run(sizes: List[int], name_filter: str = None) -> Dict[str, float]:
+    selected = re.compile(name_filter) if name_filter else None
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for size in sizes:
+            text = synthetic_text(size)
+            for bench in BENCHMARKS:
+                for name, operation in bench(text):
+                    name = f'{name}:{size}'
+                    if selected is not None and not selected.search(name):
+                        continue
+                    results[name] = time_per_op(operation)
+                    sys.stderr.write(f'{name:<32}{results[name]:>14.1f} ns/op\n')
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """
+    print every benchmark present in both, return the names of the regressions
+    """
+    regressions = []
+    for name in sorted(results.keys() & baseline.keys()):
+        ratio = results[name] / baseline[name] if baseline[name] else float('inf')
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        print(f'{name:<32}{baseline[name]:>14.1f}{results[name]:>14.1f}{ratio:>8.2f}x'
+              f'{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='mim benchmark suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='text sizes in characters')
+    parser.add_argument('--filter', metavar='REGEX', help='only run benchmarks whose name matches REGEX')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown ratio over the baseline reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.filter)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'version': BASELINE_VERSION,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('version') != BASELINE_VERSION:
+            raise SystemExit(f'unsupported baseline version: {baseline.get("version")}')
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) over {args.threshold:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
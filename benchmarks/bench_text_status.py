@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of text status allocation: the former dict-based TextStatus
+against the slotted TextStatus and the array-backed TextStatusArray.
+
+usage: PYTHONPATH=src/mim python benchmarks/bench_text_status.py [count]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from util import TextStatus, TextStatusArray
+
+TEXT = 'Hello World?  Hello World!'
+COMMANDS = ['0', '$', 'e', 'tw', 'v$']
+
+
+class DictTextStatus:
+    """
+    TextStatus as it was before it used __slots__, kept as the baseline
+    """
+
+    def __init__(self, current_text: str, current_command: str, start_pos: int = -1, end_pos: int = -1) -> None:
+        self._current_text = current_text
+        self._current_command = current_command
+        self._start_pos = start_pos
+        self._end_pos = end_pos
+
+    @property
+    def current_text(self) -> str:
+        return self._current_text
+
+    @property
+    def current_command(self) -> str:
+        return self._current_command
+
+    @property
+    def start_position(self):
+        return self._start_pos
+
+    @property
+    def end_position(self):
+        return self._end_pos
+
+
+def fill_list(status_class, count: int) -> list:
+    return [status_class(TEXT, COMMANDS[i % 5], i, i + 1) for i in range(count)]
+
+
+def fill_array(count: int) -> TextStatusArray:
+    statuses = TextStatusArray(TEXT)
+    for i in range(count):
+        statuses.append_positions(i, i + 1, COMMANDS[i % 5])
+    return statuses
+
+
+def measure(name: str, fill, count: int):
+    seconds = min(timeit.repeat(fill, number=1, repeat=5))
+    tracemalloc.start()
+    kept = fill()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    print(f'{name:<24}{seconds * 1e9 / count:>10.1f} ns/status{size / count:>10.1f} bytes/status')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    measure('TextStatus (dict)', lambda: fill_list(DictTextStatus, count), count)
+    measure('TextStatus (slots)', lambda: fill_list(TextStatus, count), count)
+    measure('TextStatusArray', lambda: fill_array(count), count)
+
+
+if __name__ == '__main__':
+    main()
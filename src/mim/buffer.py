@@ -0,0 +1,363 @@
+import mmap
+from abc import abstractmethod
+from array import array
+from bisect import bisect_right
+from typing import Any, Iterator, List, Tuple, Union
+
+# size of the chunks str texts are split into by iter_chunks, in characters
+STR_CHUNK_SIZE = 1 << 20
+
+
+class TextBuffer:
+    """
+    Read-only text interface used by the commands and the UI.
+    A plain str provides the same operations and can be used wherever a
+    TextBuffer is expected.
+    """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def chunks(self, start: int = 0) -> Iterator[Tuple[int, str]]:
+        """
+        yield (offset, text) chunks covering the buffer from start to the end
+        """
+        pass
+
+    def __getitem__(self, key: Union[int, slice]) -> str:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('slice step is not supported')
+            return self._slice(start, stop)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('buffer index out of range')
+        return self._slice(key, key + 1)
+
+    def __str__(self) -> str:
+        return self._slice(0, len(self))
+
+    def find(self, sub: str, start: int = 0, end: int = None) -> int:
+        """
+        return the lowest offset >= start where sub is found, -1 if there is none
+        """
+        length = len(self)
+        end = length if end is None else min(end, length)
+        if not sub:
+            return start if start <= end else -1
+
+        # keep the last len(sub) - 1 characters of the previous chunk for matches across chunks
+        carry = ''
+        carry_offset = start
+        for offset, chunk in self.chunks(start):
+            text = carry + chunk
+            pos = text.find(sub)
+            if pos >= 0:
+                pos += carry_offset
+                return pos if pos + len(sub) <= end else -1
+            if offset + len(chunk) >= end:
+                break
+            keep = min(len(sub) - 1, len(text))
+            carry = text[len(text) - keep:] if keep else ''
+            carry_offset = offset + len(chunk) - len(carry)
+        return -1
+
+    def index(self, sub: str, start: int = 0, end: int = None) -> int:
+        pos = self.find(sub, start, end)
+        if pos < 0:
+            raise ValueError('substring not found')
+        return pos
+
+    def _slice(self, start: int, stop: int) -> str:
+        parts = []
+        for offset, chunk in self.chunks(start):
+            if offset >= stop:
+                break
+            parts.append(chunk[:stop - offset])
+        return ''.join(parts)
+
+
+def iter_chunks(text: Union[str, TextBuffer], start: int = 0) -> Iterator[Tuple[int, str]]:
+    """
+    yield (offset, text) chunks of a str or a TextBuffer from start to the end
+    """
+    if isinstance(text, str):
+        if start == 0 and len(text) <= STR_CHUNK_SIZE:
+            yield 0, text
+            return
+        for offset in range(start, len(text), STR_CHUNK_SIZE):
+            yield offset, text[offset:offset + STR_CHUNK_SIZE]
+    else:
+        yield from text.chunks(start)
+
+
+def code_points(text: Union[str, TextBuffer]) -> Any:
+    """
+    return the code points of a str or a TextBuffer as a NumPy uint32 array, filled
+    chunk by chunk rather than from one copy of the whole text
+    """
+    import numpy as np
+
+    codes = np.empty(len(text), dtype=np.uint32)
+    for offset, chunk in iter_chunks(text):
+        codes[offset:offset + len(chunk)] = np.frombuffer(chunk.encode('utf-32-le', errors='surrogatepass'),
+                                                          dtype=np.uint32)
+    return codes
+
+
+class PieceTable(TextBuffer):
+    """
+    Immutable piece table. Edits return a new table sharing the pieces of
+    the original and inserted texts, nothing is copied.
+    """
+
+    def __init__(self, text: str = '') -> None:
+        # (source text, start, end) per piece, _offsets[i] is the buffer offset of piece i
+        self._pieces: List[Tuple[str, int, int]] = [(text, 0, len(text))] if text else []
+        self._offsets = array('q', [0] if text else [])
+        self._length = len(text)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def chunks(self, start: int = 0) -> Iterator[Tuple[int, str]]:
+        i = self._piece_at(start)
+        if i < 0:
+            return
+        source, piece_start, piece_end = self._pieces[i]
+        skip = start - self._offsets[i]
+        yield start, source[piece_start + skip:piece_end]
+        for i in range(i + 1, len(self._pieces)):
+            source, piece_start, piece_end = self._pieces[i]
+            yield self._offsets[i], source[piece_start:piece_end]
+
+    def __getitem__(self, key: Union[int, slice]) -> str:
+        if isinstance(key, slice):
+            return super().__getitem__(key)
+        if key < 0:
+            key += self._length
+        i = self._piece_at(key)
+        if i < 0:
+            raise IndexError('buffer index out of range')
+        source, piece_start, _ = self._pieces[i]
+        return source[piece_start + key - self._offsets[i]]
+
+    def find(self, sub: str, start: int = 0, end: int = None) -> int:
+        end = self._length if end is None else min(end, self._length)
+        if not sub:
+            return start if start <= end else -1
+
+        # search every piece in place, plus the joins with the last len(sub) - 1 characters before it
+        keep = len(sub) - 1
+        carry = ''
+        i = self._piece_at(start)
+        while 0 <= i < len(self._pieces) and self._offsets[i] < end:
+            source, piece_start, piece_end = self._pieces[i]
+            search_start = piece_start + max(start - self._offsets[i], 0)
+            base = self._offsets[i] - piece_start
+            if carry:
+                # only the rest of this piece, its source goes on with deleted or unrelated text
+                pos = (carry + source[search_start:min(search_start + keep, piece_end)]).find(sub)
+                if pos >= 0:
+                    pos += base + search_start - len(carry)
+                    return pos if pos + len(sub) <= end else -1
+            pos = source.find(sub, search_start, piece_end)
+            if pos >= 0:
+                pos += base
+                return pos if pos + len(sub) <= end else -1
+            if keep:
+                # pieces shorter than keep extend the carry rather than replace it
+                carry = (carry + source[max(search_start, piece_end - keep):piece_end])[-keep:]
+            i += 1
+        return -1
+
+    def insert(self, pos: int, text: str) -> 'PieceTable':
+        if not 0 <= pos <= self._length:
+            raise IndexError('insert position out of range')
+        if not text:
+            return self
+        left, right = self._split(pos)
+        return PieceTable._from_pieces(left + [(text, 0, len(text))] + right)
+
+    def delete(self, start: int, end: int) -> 'PieceTable':
+        if not 0 <= start <= end <= self._length:
+            raise IndexError('delete range out of range')
+        if start == end:
+            return self
+        left, _ = self._split(start)
+        _, right = self._split(end)
+        return PieceTable._from_pieces(left + right)
+
+    def _slice(self, start: int, stop: int) -> str:
+        parts = []
+        i = self._piece_at(start)
+        while 0 <= i < len(self._pieces) and self._offsets[i] < stop:
+            source, piece_start, piece_end = self._pieces[i]
+            base = self._offsets[i] - piece_start
+            parts.append(source[max(start - base, piece_start):min(stop - base, piece_end)])
+            i += 1
+        return ''.join(parts)
+
+    def _piece_at(self, pos: int) -> int:
+        """
+        return the index of the piece holding offset pos, -1 if pos is out of range
+        """
+        if not 0 <= pos < self._length:
+            return -1
+        return bisect_right(self._offsets, pos) - 1
+
+    def _split(self, pos: int) -> Tuple[List[Tuple[str, int, int]], List[Tuple[str, int, int]]]:
+        """
+        return the pieces before and after offset pos
+        """
+        if pos == self._length:
+            return list(self._pieces), []
+        i = self._piece_at(pos)
+        source, piece_start, piece_end = self._pieces[i]
+        split = piece_start + pos - self._offsets[i]
+        left = self._pieces[:i]
+        if split > piece_start:
+            left.append((source, piece_start, split))
+        return left, [(source, split, piece_end)] + self._pieces[i + 1:]
+
+    @staticmethod
+    def _from_pieces(pieces: List[Tuple[str, int, int]]) -> 'PieceTable':
+        table = PieceTable()
+        offset = 0
+        for piece in pieces:
+            table._pieces.append(piece)
+            table._offsets.append(offset)
+            offset += piece[2] - piece[1]
+        table._length = offset
+        return table
+
+
+class MmapBuffer(TextBuffer):
+    """
+    Read-only buffer over a memory-mapped UTF-8 file.
+    The file is split into blocks starting on character boundaries; the
+    character offset of every block is recorded once, so that character
+    offsets map to byte offsets with a bisect and the decoding of a single
+    block. Only the blocks being looked at are decoded.
+    """
+
+    BLOCK_SIZE: int = 1 << 16
+
+    def __init__(self, path: str, block_size: int = BLOCK_SIZE) -> None:
+        self._path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            self._mmap = b''
+        self._block_size = block_size
+        # byte and character offset of every block
+        self._block_bytes = array('q')
+        self._block_chars = array('q')
+        self._length = self._index_blocks()
+        # last decoded block, as (block index, text)
+        self._cached_block: Tuple[int, str] = (-1, '')
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __len__(self) -> int:
+        return self._length
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> 'MmapBuffer':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def chunks(self, start: int = 0) -> Iterator[Tuple[int, str]]:
+        if not 0 <= start < self._length:
+            return
+        i = bisect_right(self._block_chars, start) - 1
+        yield start, self._block_text(i)[start - self._block_chars[i]:]
+        for i in range(i + 1, len(self._block_chars)):
+            yield self._block_chars[i], self._block_text(i)
+
+    def __getitem__(self, key: Union[int, slice]) -> str:
+        if isinstance(key, slice):
+            return super().__getitem__(key)
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError('buffer index out of range')
+        i = bisect_right(self._block_chars, key) - 1
+        return self._block_text(i)[key - self._block_chars[i]]
+
+    def find(self, sub: str, start: int = 0, end: int = None) -> int:
+        end = self._length if end is None else min(end, self._length)
+        if not sub:
+            return start if start <= end else -1
+        if start >= self._length:
+            return -1
+        # search the raw bytes, UTF-8 matches never start inside another character
+        pos = self._mmap.find(sub.encode('utf-8'), self.byte_offset(start), self.byte_offset(end))
+        if pos < 0:
+            return -1
+        return self.char_offset(pos)
+
+    def byte_offset(self, char_offset: int) -> int:
+        """
+        return the byte offset of the character at char_offset
+        """
+        if char_offset >= self._length:
+            return len(self._mmap)
+        i = bisect_right(self._block_chars, char_offset) - 1
+        prefix = self._block_text(i)[:char_offset - self._block_chars[i]]
+        return self._block_bytes[i] + len(prefix.encode('utf-8', errors='surrogateescape'))
+
+    def char_offset(self, byte_offset: int) -> int:
+        """
+        return the character offset of the character starting at byte_offset
+        """
+        if byte_offset >= len(self._mmap):
+            return self._length
+        i = bisect_right(self._block_bytes, byte_offset) - 1
+        return self._block_chars[i] + len(MmapBuffer._decode(self._mmap[self._block_bytes[i]:byte_offset]))
+
+    def _slice(self, start: int, stop: int) -> str:
+        if start >= stop:
+            return ''
+        return MmapBuffer._decode(self._mmap[self.byte_offset(start):self.byte_offset(stop)])
+
+    def _block_text(self, i: int) -> str:
+        if self._cached_block[0] != i:
+            byte_end = self._block_bytes[i + 1] if i + 1 < len(self._block_bytes) else len(self._mmap)
+            self._cached_block = (i, MmapBuffer._decode(self._mmap[self._block_bytes[i]:byte_end]))
+        return self._cached_block[1]
+
+    def _index_blocks(self) -> int:
+        size = len(self._mmap)
+        byte_start = 0
+        char_start = 0
+        while byte_start < size:
+            byte_end = min(byte_start + self._block_size, size)
+            # move the block end back to the start of a character
+            while byte_end < size and self._mmap[byte_end] & 0xC0 == 0x80 and byte_end > byte_start + 1:
+                byte_end -= 1
+            block = self._mmap[byte_start:byte_end]
+            self._block_bytes.append(byte_start)
+            self._block_chars.append(char_start)
+            char_start += len(block) if block.isascii() else len(MmapBuffer._decode(block))
+            byte_start = byte_end
+        return char_start
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        # invalid bytes are kept as lone surrogates, one character per byte
+        return data.decode('utf-8', errors='surrogateescape')
@@ -1,7 +1,11 @@
 import sys
-from typing import List
+from typing import Any, Callable, Dict, Pattern, Sequence, Tuple
 
-from util import TextStatus
+from buffer import code_points
+from history import CommandHistory
+from macro import CompiledMacro, CompiledStep, MacroRegisters
+from shared_text import SharedText
+from util import Cursors, LRUCache, TextStatus
 import re
 
 
@@ -11,133 +15,552 @@ class Command:
     decorators.
     """
     _re = None
+    # accepted command texts, without anchors, see CommandDispatcher; its named groups are handed to compile
+    _pattern: str = None
+
+    @property
+    def pattern(self) -> str:
+        return self._pattern
 
     def execute(self, text_status: TextStatus) -> TextStatus:
         pass
 
     def validate(self, command_text: str) -> bool:
         if self._re.search(command_text):
-            return True
+            return self.accepts(command_text)
         return False
 
+    def accepts(self, command_text: str) -> bool:
+        """
+        checks a text matching the pattern must pass as well, see CommandDispatcher
+        """
+        return True
+
+    def compile(self, command_text: str, groups: Dict[str, str] = None) -> CompiledStep:
+        """
+        parse a valid command text once into a handler and its arguments;
+        handler(text_status, *arguments) does what execute would do. groups
+        are the named groups of the pattern as matched by the dispatcher,
+        command_text is parsed again without them.
+        """
+        return self._execute_text, (command_text,)
+
+    def recordable(self, command_text: str) -> bool:
+        """
+        whether command_text is recorded into macros
+        """
+        return True
+
+    def pushes_history(self, command_text: str) -> bool:
+        """
+        whether the status returned by execute is added to the history
+        """
+        return True
+
+    def _execute_text(self, text_status: TextStatus, command_text: str) -> TextStatus:
+        return self.execute(TextStatus.from_shared(text_status.shared_text, command_text,
+                                                   text_status.start_position, text_status.end_position,
+                                                   text_status.cursors))
+
+
+class SessionClosed(Exception):
+    """
+    Raised by AppCommand.close_session to end the current session
+    instead of the whole process
+    """
+
 
 class AppCommand(Command):
 
     # editor exit command
     COMMAND_EXIT = 'bye'
+    # undo, redo, and switch to the older/newer branch of the undo tree
     COMMAND_REVERT = 'z'
+    COMMAND_REDO = 'Z'
+    COMMAND_OLDER_BRANCH = 'z-'
+    COMMAND_NEWER_BRANCH = 'z+'
+
+    _pattern = r'bye|z[-+]?|Z'
+    _re = re.compile(r'^(?:%s)$' % _pattern)
 
-    _re = re.compile(r'(^bye$)|(^z$)')
+    MESSAGE_RECORDING = "History commands cannot be recorded, stop the recording with 'q' first."
 
-    def __init__(self, command_history: List[TextStatus]):
+    def __init__(self, command_history: CommandHistory, exit_handler: Callable[[], None] = None,
+                 message_handler: Callable[[str], None] = None, macros: MacroRegisters = None):
         self._command_history = command_history
+        # called on 'bye', exits the process by default
+        self._exit_handler = exit_handler or AppCommand._sys_exit
+        # called with messages for the user, e.g. MimUI.output_message; printed by default
+        self._message_handler = message_handler or print
+        # history commands are refused while a macro is recorded, its playback could not repeat them
+        self._macros = macros
         super().__init__()
 
     def execute(self, text_status: TextStatus) -> TextStatus:
         cur_command = text_status.current_command
 
         if cur_command == AppCommand.COMMAND_EXIT:
-            AppCommand._sys_exit()
+            self._exit_handler()
+        elif self._macros is not None and self._macros.recording is not None:
+            self._message_handler(AppCommand.MESSAGE_RECORDING)
+            return self._command_history.current
         elif cur_command == AppCommand.COMMAND_REVERT:
             return self._revert()
+        elif cur_command == AppCommand.COMMAND_REDO:
+            return self._move(self._command_history.redo(), 'Nothing to redo.')
+        elif cur_command == AppCommand.COMMAND_OLDER_BRANCH:
+            return self._move(self._command_history.older_branch(), 'There is no older branch.')
+        elif cur_command == AppCommand.COMMAND_NEWER_BRANCH:
+            return self._move(self._command_history.newer_branch(), 'There is no newer branch.')
+
+    def recordable(self, command_text: str) -> bool:
+        # reverts and exits act on the session, not on the text
+        return False
+
+    def pushes_history(self, command_text: str) -> bool:
+        # history commands move in the history themselves
+        return False
 
     @staticmethod
     def _sys_exit():
         print('Thank you for your time.  Alan Yan  alanyan@outlook.com ')
         sys.exit(0)
 
+    @staticmethod
+    def close_session():
+        raise SessionClosed()
+
     def _revert(self) -> TextStatus:
-        if len(self._command_history) > 1:
-            self._command_history.pop()
-        else:
-            print('This is the very begninng. Calm down and enjoy it.')
-        # need to pop "current" text status,  as it
-        # will be re-pushed to history stack
-        # after command executed in Mim App.
-        return self._command_history.pop()
+        # the reverted state is kept, 'Z' goes back to it
+        return self._move(self._command_history.undo(), 'This is the very begninng. Calm down and enjoy it.')
+
+    def _move(self, text_status: TextStatus, message: str) -> TextStatus:
+        # stay at the current state if there is nowhere to move
+        if text_status is None:
+            self._message_handler(message)
+            return self._command_history.current
+        return text_status
 
 
 class NavigationCommand(Command):
     """
     Concrete Components provide default implementations of the operations.
     """
-    _re = re.compile(r'(^[0$e]$)|(^t.$)')
+    # optional count prefix, e.g. '3e', '2tx'; a count never starts with 0, which moves to the beginning
+    # '/' is followed by a regular expression, e.g. '/err(or)?', 'n' repeats the last search
+    _pattern = r'(?P<count>[1-9][0-9]*(?![0-9]))?(?P<motion>[0$ejkn]|t.|/.+)'
+    _re = re.compile(r'^(?:%s)$' % _pattern)
 
-    # command_list = ['0', '$', 'e', 't']
+    # command_list = ['0', '$', 'e', 't', 'j', 'k']
+    # '0' and '$' move to the beginning and the end of the current line
     COMMAND_MOVE_TO_BEGINNING = '0'
     COMMAND_MOVE_TO_END = '$'
     COMMAND_MOVE_TO_WORD_END = 'e'
     COMMAND_MOVE_TO_NEXT_MATCHED = 't'
+    COMMAND_MOVE_DOWN = 'j'
+    COMMAND_MOVE_UP = 'k'
+    COMMAND_SEARCH = '/'
+    COMMAND_REPEAT_SEARCH = 'n'
+    _LINE_MOTIONS = (COMMAND_MOVE_TO_BEGINNING, COMMAND_MOVE_TO_END, COMMAND_MOVE_DOWN, COMMAND_MOVE_UP)
 
     EMPTY_STRING = ' '
 
+    # navigation results kept per command instance
+    DEFAULT_CACHE_SIZE: int = 4096
+    # compiled search patterns kept per command instance
+    PATTERN_CACHE_SIZE: int = 128
+    # code point arrays of the texts last moved over with multiple cursors
+    CODES_CACHE_SIZE: int = 2
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        # (text generation, count, motion, start, end) -> (new start, new end); a new
+        # text gets a new generation, so entries of an old text never match again
+        self._cache = LRUCache(cache_size)
+        # search pattern text -> compiled pattern
+        self._patterns = LRUCache(NavigationCommand.PATTERN_CACHE_SIZE)
+        # pattern text of the last search, repeated by 'n'
+        self._last_search: str = None
+        # text generation -> NumPy code points of the text, see move_cursors
+        self._codes = LRUCache(NavigationCommand.CODES_CACHE_SIZE)
+        super().__init__()
+
+    @property
+    def cache(self) -> LRUCache:
+        return self._cache
+
+    def accepts(self, command_text: str) -> bool:
+        # a search pattern must be a valid regular expression
+        _, motion = NavigationCommand.split_count(command_text)
+        return motion[0] != NavigationCommand.COMMAND_SEARCH or self._compile_pattern(motion[1:]) is not None
+
     def execute(self, text_status: TextStatus) -> TextStatus:
+        # the motion is repeated count times in a single lookup
+        count, motion = NavigationCommand.split_count(text_status.current_command)
+        return self._execute_motion(text_status, text_status.current_command, count, motion)
 
-        cur_text = text_status.current_text
-        cur_command = text_status.current_command
+    def compile(self, command_text: str, groups: Dict[str, str] = None) -> CompiledStep:
+        if groups is None:
+            count, motion = NavigationCommand.split_count(command_text)
+        else:
+            count, motion = int(groups['count'] or 1), groups['motion']
+        return self._execute_motion, (command_text, count, motion)
+
+    def _execute_motion(self, text_status: TextStatus, cur_command: str, count: int, motion: str) -> TextStatus:
+
+        # new statuses share the text of the current one, it is never copied
+        cur_text = text_status.shared_text
+        motion = self._resolve_search(motion)
+
+        if text_status.cursors is not None:
+            new_starts, new_ends = self._move_cursors(cur_text, count, motion,
+                                                      text_status.cursors.starts, text_status.cursors.ends)
+            return TextStatus.from_cursors(cur_text, cur_command, Cursors.of(new_starts, new_ends))
+
+        key = (cur_text.generation, count, motion, text_status.start_position, text_status.end_position)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return TextStatus.from_shared(cur_text, cur_command, cached[0], cached[1])
+
+        if motion == NavigationCommand.COMMAND_MOVE_TO_BEGINNING:
+            text_status_new = NavigationCommand._move_to_beginning(cur_text, text_status.start_position)
+        elif motion == NavigationCommand.COMMAND_MOVE_TO_END:
+            text_status_new = NavigationCommand._move_to_end(cur_text, text_status.start_position, count)
+        elif motion == NavigationCommand.COMMAND_MOVE_DOWN:
+            text_status_new = NavigationCommand._move_to_line(cur_text, text_status.start_position, count)
+        elif motion == NavigationCommand.COMMAND_MOVE_UP:
+            text_status_new = NavigationCommand._move_to_line(cur_text, text_status.start_position, -count)
+        elif motion == NavigationCommand.COMMAND_MOVE_TO_WORD_END:
+            text_status_new = NavigationCommand._move_to_word_end(cur_text, text_status.end_position, count)
+        elif motion is None or motion[0] == NavigationCommand.COMMAND_SEARCH:
+            # nothing to repeat or an invalid pattern stay where they are
+            pattern = self._compile_pattern(motion[1:]) if motion else None
+            text_status_new = NavigationCommand._move_to_pattern(cur_text, pattern, text_status, count)
+        else:
+            text_status_new = NavigationCommand._move_to_next_matched(current_text=cur_text,
+                                                                      current_command=motion,
+                                                                      search_start_pos=text_status.start_position,
+                                                                      count=count)
+        text_status_new.current_command = cur_command
+        self._cache.put(key, (text_status_new.start_position, text_status_new.end_position))
+        return text_status_new
 
-        if cur_command == NavigationCommand.COMMAND_MOVE_TO_BEGINNING:
-            return NavigationCommand._move_to_beginning(cur_text)
-        elif cur_command == NavigationCommand.COMMAND_MOVE_TO_END:
-            return NavigationCommand._move_to_end(cur_text)
-        elif cur_command == NavigationCommand.COMMAND_MOVE_TO_WORD_END:
-            return NavigationCommand._move_to_word_end(cur_text, text_status.end_position)
+    def _resolve_search(self, motion: str) -> str:
+        """
+        remember the pattern of a search; 'n' becomes a search of the last pattern,
+        None if there was no search yet
+        """
+        if motion == NavigationCommand.COMMAND_REPEAT_SEARCH:
+            if self._last_search is None:
+                return None
+            return NavigationCommand.COMMAND_SEARCH + self._last_search
+        if motion[0] == NavigationCommand.COMMAND_SEARCH:
+            self._last_search = motion[1:]
+        return motion
+
+    def move_cursors(self, shared_text: SharedText, command_text: str,
+                     start_positions: Sequence[int], end_positions: Sequence[int]) -> Tuple[Any, Any]:
+        """
+        run one navigation command from many selections over the same text at once, with
+        the same result as execute from each of them; return NumPy arrays of the new
+        start and end positions, in the order of the given ones
+        """
+        count, motion = NavigationCommand.split_count(command_text)
+        return self._move_cursors(shared_text, count, self._resolve_search(motion), start_positions, end_positions)
+
+    def _move_cursors(self, shared_text: SharedText, count: int, motion: str, start_positions, end_positions):
+        import numpy as np
+
+        start_positions = np.asarray(start_positions, dtype=np.int64)
+        end_positions = np.asarray(end_positions, dtype=np.int64)
+        if motion is None or motion[0] == NavigationCommand.COMMAND_SEARCH:
+            return self._search_cursors(np, shared_text, motion, start_positions, end_positions, count)
+
+        # every cursor is a record spanning the whole text
+        codes = self._text_codes(shared_text)
+        record_starts = np.zeros(len(start_positions), dtype=np.int64)
+        record_ends = np.full(len(start_positions), len(codes), dtype=np.int64)
+        return NavigationCommand._batch_motion(np, codes, record_starts, record_ends, count, motion,
+                                               start_positions, end_positions)
+
+    def _search_cursors(self, np, shared_text: SharedText, motion: str, start_positions, end_positions,
+                        count: int):
+        # the match starts are found once, from the first cursor on; each cursor then
+        # takes the count-th one at or after its end, as _move_to_pattern would
+        pattern = self._compile_pattern(motion[1:]) if motion else None
+        if pattern is None or not len(end_positions):
+            return start_positions, end_positions
+        literal = NavigationCommand._literal(pattern)
+        if literal and shared_text.suffix_array is not None:
+            matches = shared_text.suffix_array.occurrences(literal)
         else:
-            return NavigationCommand._move_to_next_matched(current_text=cur_text,
-                                                           current_command=cur_command,
-                                                           search_start_pos=text_status.start_position)
+            matches = np.array(shared_text.index.pattern_positions(pattern, int(end_positions.min())),
+                               dtype=np.int64)
+        if not len(matches):
+            return start_positions, end_positions
+        i = np.searchsorted(matches, np.maximum(end_positions, 0), side='left') + count - 1
+        found = i < len(matches)
+        matched = matches[np.minimum(i, len(matches) - 1)].astype(np.int64)
+        return np.where(found, matched, start_positions), np.where(found, matched + 1, end_positions)
+
+    def _text_codes(self, shared_text: SharedText):
+        codes = self._codes.get(shared_text.generation)
+        if codes is None:
+            # a memory-mapped text is decoded a chunk at a time, never copied into one str
+            codes = code_points(shared_text.text)
+            self._codes.put(shared_text.generation, codes)
+        return codes
 
     @staticmethod
-    def _move_to_beginning(current_text: str) -> TextStatus:
-        return TextStatus(current_text=current_text,
-                          current_command=NavigationCommand.COMMAND_MOVE_TO_BEGINNING,
-                          start_pos=0,
-                          end_pos=1)
+    def split_count(command_text: str) -> Tuple[int, str]:
+        """
+        split a navigation command text into its count (1 if none) and its motion
+        """
+        if not command_text or command_text[0] not in '123456789':
+            return 1, command_text
+        i = 1
+        while i < len(command_text) and '0' <= command_text[i] <= '9':
+            i += 1
+        return int(command_text[:i]), command_text[i:]
+
+    def execute_batch(self, texts: Sequence[str], command_text: str,
+                      start_positions: Sequence[int], end_positions: Sequence[int]) -> Tuple[Any, Any]:
+        """
+        run one navigation command over many texts at once, with the same result as
+        execute on each of them; return NumPy arrays of the new start and end positions
+        """
+        # NumPy is only needed by batch navigation, do not load it with the module
+        import numpy as np
+
+        if not self.validate(command_text):
+            raise ValueError(f'not a navigation command: {command_text!r}')
+
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        start_positions = np.asarray(start_positions, dtype=np.int64)
+        end_positions = np.asarray(end_positions, dtype=np.int64)
+
+        count, motion = NavigationCommand.split_count(command_text)
+        if motion[0] in (NavigationCommand.COMMAND_SEARCH, NavigationCommand.COMMAND_REPEAT_SEARCH):
+            # regular expressions are not vectorized, search text by text
+            new_positions = [self.execute(TextStatus(text, command_text, start, end))
+                             for text, start, end in zip(texts, start_positions.tolist(), end_positions.tolist())]
+            return (np.fromiter((status.start_position for status in new_positions), dtype=np.int64,
+                                count=len(new_positions)),
+                    np.fromiter((status.end_position for status in new_positions), dtype=np.int64,
+                                count=len(new_positions)))
+
+        # pack all texts into one array of code points, record i starts at offsets[i]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+        return NavigationCommand._batch_motion(np, codes, offsets[:-1], offsets[1:], count, motion,
+                                               start_positions, end_positions)
 
     @staticmethod
-    def _move_to_end(current_text: str) -> TextStatus:
-        start_pos = len(current_text) - 1
-        end_pos = len(current_text)
-        return TextStatus(current_text=current_text,
-                          current_command=NavigationCommand.COMMAND_MOVE_TO_END,
-                          start_pos=start_pos,
-                          end_pos=end_pos)
+    def _batch_motion(np, codes, record_starts, record_ends, count: int, motion: str,
+                      start_positions, end_positions):
+        """
+        new start and end positions of a non-search motion, for position i in the
+        record codes[record_starts[i]:record_ends[i]]
+        """
+        if motion in NavigationCommand._LINE_MOTIONS:
+            new_start_positions = NavigationCommand._batch_line_motion(np, codes, record_starts, record_ends,
+                                                                       motion, start_positions, count)
+            return new_start_positions, new_start_positions + 1
+        if motion == NavigationCommand.COMMAND_MOVE_TO_WORD_END:
+            new_end_positions = NavigationCommand._batch_word_end(np, codes, record_starts, record_ends,
+                                                                  end_positions, count)
+        else:
+            new_end_positions = NavigationCommand._batch_next_matched(np, codes, record_starts, record_ends,
+                                                                      motion[1], start_positions, count)
+        return new_end_positions - 1, new_end_positions
 
     @staticmethod
-    def _move_to_word_end(current_text: str, current_position: int) -> TextStatus:
+    def _batch_line_motion(np, codes, record_starts, record_ends, motion: str, current_positions, count: int):
+        # newline offsets, padded so that clipped lookups stay in bounds
+        newlines = np.flatnonzero(codes == ord('\n'))
+        padded = np.append(newlines, len(codes))
+        # newlines of the record: newlines[first:last]; the line of a position is the number of them before it
+        first = np.searchsorted(newlines, record_starts, side='left')
+        last = np.searchsorted(newlines, record_ends, side='left')
+        pos = record_starts + np.maximum(current_positions, 0)
+        # a newline ending the record ends its last line, no empty line follows it
+        ends_with_newline = np.zeros(len(record_starts), dtype=np.int64)
+        non_empty = record_ends > record_starts
+        ends_with_newline[non_empty] = codes[record_ends[non_empty] - 1] == ord('\n')
+        last_line = last - first - ends_with_newline
+        # a position past the end of its record is on the last line
+        line = np.minimum(np.searchsorted(newlines, np.minimum(pos, record_ends), side='left') - first, last_line)
+
+        def line_start(line):
+            return np.where(line == 0, record_starts, padded[np.clip(first + line - 1, 0, None)] + 1)
+
+        def line_end(line):
+            return np.where(first + line < last, padded[first + line], record_ends)
+
+        if motion == NavigationCommand.COMMAND_MOVE_TO_BEGINNING:
+            new_positions = line_start(line)
+        elif motion == NavigationCommand.COMMAND_MOVE_TO_END:
+            target = np.minimum(line + count - 1, last_line)
+            target_start, target_end = line_start(target), line_end(target)
+            new_positions = np.where(target_end > target_start, target_end - 1, target_start)
+        else:
+            delta = count if motion == NavigationCommand.COMMAND_MOVE_DOWN else -count
+            target = np.clip(line + delta, 0, last_line)
+            target_start, target_end = line_start(target), line_end(target)
+            column = pos - line_start(line)
+            new_positions = target_start + np.minimum(column, np.maximum(target_end - target_start - 1, 0))
+        return new_positions - record_starts
 
-        # skip leading empty characters if any
-        search_start_pos = current_position
-        while (search_start_pos < len(current_text)) and (current_text[search_start_pos] == NavigationCommand.EMPTY_STRING):
-            search_start_pos += 1
+    @staticmethod
+    def _batch_word_end(np, codes, record_starts, record_ends, current_positions, count: int):
+        # a word ends after a non-space followed by a space or by the end of its record
+        is_space = NavigationCommand._batch_char_mask(np, codes, str.isspace)
+        followed_by_space = np.ones_like(is_space)
+        followed_by_space[:-1] = is_space[1:]
+        followed_by_space[record_ends[record_ends > record_starts] - 1] = True
+        word_ends = np.flatnonzero(~is_space & followed_by_space) + 1
+
+        # count-th word end after the current position, stopping at the last one of the record
+        search_pos = record_starts + np.maximum(current_positions, 0)
+        i = np.searchsorted(word_ends, search_pos, side='right')
+        last = np.searchsorted(word_ends, record_ends, side='right') - 1
+        found = i <= last
+        word_end = word_ends[np.clip(np.minimum(i + count - 1, last), 0, None)] if len(word_ends) else search_pos
+        return np.where(found, word_end - record_starts, np.minimum(current_positions, record_ends - record_starts))
 
-        if len(current_text) == search_start_pos:
-            end_pos = current_position
-        else:
-            # find the end of word
+    @staticmethod
+    def _batch_next_matched(np, codes, record_starts, record_ends, search_char: str,
+                            search_start_positions, count: int):
+        key = search_char.lower()
+        positions = np.flatnonzero(NavigationCommand._batch_char_mask(np, codes, lambda c: c.lower() == key))
+
+        # count-th match at or after the search start, within the record
+        search_pos = record_starts + np.maximum(search_start_positions, 0)
+        i = np.searchsorted(positions, search_pos, side='left') + count - 1
+        found = i < len(positions)
+        matched = positions[np.minimum(i, len(positions) - 1)] if len(positions) else search_pos
+        found &= matched < record_ends
+        return np.where(found, matched - record_starts, search_start_positions + 1)
+
+    @staticmethod
+    def _batch_char_mask(np, codes, predicate):
+        """
+        mask of the code points satisfying predicate, evaluated once per distinct character
+        """
+        distinct = np.unique(codes)
+        selected = [c for c in distinct.tolist() if predicate(chr(c))]
+        return np.isin(codes, np.array(selected, dtype=codes.dtype))
+
+    @staticmethod
+    def _move_to_beginning(current_text: SharedText, current_position: int) -> TextStatus:
+        index = current_text.index
+        start_pos = index.line_start(index.line_of(max(current_position, 0)))
+        return TextStatus.from_shared(current_text,
+                                      current_command=NavigationCommand.COMMAND_MOVE_TO_BEGINNING,
+                                      start_pos=start_pos,
+                                      end_pos=start_pos+1)
+
+    @staticmethod
+    def _move_to_end(current_text: SharedText, current_position: int, count: int = 1) -> TextStatus:
+        # '3$' moves to the end of the second line below, as in vim
+        index = current_text.index
+        line = index.line_of(max(current_position, 0)) + count - 1
+        line_start = index.line_start(line)
+        end_pos = index.line_end(line)
+        if end_pos <= line_start:
+            # empty line, stay at its start
+            end_pos = line_start + 1
+        return TextStatus.from_shared(current_text,
+                                      current_command=NavigationCommand.COMMAND_MOVE_TO_END,
+                                      start_pos=end_pos-1,
+                                      end_pos=end_pos)
+
+    @staticmethod
+    def _move_to_line(current_text: SharedText, current_position: int, delta: int) -> TextStatus:
+        # keep the column, within the last character of the target line
+        index = current_text.index
+        line, column = index.line_column(max(current_position, 0))
+        line = max(line + delta, 0)
+        line_start = index.line_start(line)
+        start_pos = line_start + min(column, max(index.line_end(line) - line_start - 1, 0))
+        return TextStatus.from_shared(current_text,
+                                      current_command=NavigationCommand.COMMAND_MOVE_DOWN if delta > 0
+                                      else NavigationCommand.COMMAND_MOVE_UP,
+                                      start_pos=start_pos,
+                                      end_pos=start_pos+1)
+
+    @staticmethod
+    def _move_to_word_end(current_text: SharedText, current_position: int, count: int = 1) -> TextStatus:
+
+        # skip leading empty characters if any, then find the end of word
+        end_pos = current_text.index.find_word_end(current_position, count)
+        if end_pos < 0:
+            # no word ends after the position, stay within the text
+            end_pos = min(current_position, len(current_text.text))
+
+        return TextStatus.from_shared(current_text,
+                                      current_command=NavigationCommand.COMMAND_MOVE_TO_WORD_END,
+                                      start_pos=end_pos-1,
+                                      end_pos=end_pos)
+
+    def _compile_pattern(self, pattern_text: str) -> Pattern:
+        """
+        compiled pattern_text, None if it is not a valid regular expression
+        """
+        pattern = self._patterns.get(pattern_text)
+        if pattern is None:
             try:
-                end_pos = current_text.index(NavigationCommand.EMPTY_STRING, search_start_pos)
-            except ValueError:
-                end_pos = len(current_text)
+                pattern = re.compile(pattern_text)
+            except re.error:
+                return None
+            self._patterns.put(pattern_text, pattern)
+        return pattern
 
-        return TextStatus(current_text=current_text,
-                          current_command=NavigationCommand.COMMAND_MOVE_TO_WORD_END,
-                          start_pos=end_pos-1,
-                          end_pos=end_pos)
+    # characters with a special meaning in a regular expression, see _literal
+    _REGEX_SPECIAL = frozenset('.^$*+?{}[]\\|()')
 
     @staticmethod
-    def _move_to_next_matched(current_text: str, current_command: str, search_start_pos: int):
+    def _literal(pattern: Pattern) -> str:
+        """
+        the text matched by pattern if it is a plain literal, None otherwise
+        """
+        if NavigationCommand._REGEX_SPECIAL.isdisjoint(pattern.pattern):
+            return pattern.pattern
+        return None
+
+    @staticmethod
+    def _move_to_pattern(current_text: SharedText, pattern: Pattern, text_status: TextStatus,
+                         count: int = 1) -> TextStatus:
+        # search from the end of the current selection, stay if there is no match
+        start_pos = -1
+        if pattern is not None:
+            literal = NavigationCommand._literal(pattern)
+            if literal and current_text.suffix_array is not None:
+                start_pos = current_text.suffix_array.find(literal, text_status.end_position, count)
+            else:
+                start_pos = current_text.index.find_pattern(pattern, text_status.end_position, count)
+        if start_pos < 0:
+            start_pos, end_pos = text_status.start_position, text_status.end_position
+        else:
+            end_pos = start_pos + 1
+        return TextStatus.from_shared(current_text,
+                                      current_command=NavigationCommand.COMMAND_SEARCH,
+                                      start_pos=start_pos,
+                                      end_pos=end_pos)
+
+    @staticmethod
+    def _move_to_next_matched(current_text: SharedText, current_command: str, search_start_pos: int,
+                              count: int = 1) -> TextStatus:
 
         search_char = current_command[1]
-        try:
-            end_pos = current_text.lower().index(search_char.lower(), search_start_pos)
-        except ValueError:
+        end_pos = current_text.index.find_char(search_char, search_start_pos, count)
+        if end_pos < 0:
             end_pos = search_start_pos + 1
 
-        return TextStatus(current_text=current_text,
-                          current_command=current_command,
-                          start_pos=end_pos-1,
-                          end_pos=end_pos)
+        return TextStatus.from_shared(current_text,
+                                      current_command=current_command,
+                                      start_pos=end_pos-1,
+                                      end_pos=end_pos)
 
 
 class Decorator(Command):
@@ -160,6 +583,10 @@ class Decorator(Command):
 
         return self._sub_command
 
+    @property
+    def pattern(self) -> str:
+        return self._sub_command.pattern
+
     def execute(self, text_status: TextStatus) -> TextStatus:
         return self._sub_command.execute(text_status)
 
@@ -172,33 +599,153 @@ class SelectionCommand(Decorator):
     COMMAND_SELECTION = 'v'
     _re = re.compile(r'^v')
 
+    @property
+    def pattern(self) -> str:
+        return r'v(?:%s)' % self.sub_command.pattern
+
     def execute(self, text_status: TextStatus) -> TextStatus:
         """
         Decorators may call parent implementation of the operation, instead of
         calling the wrapped object directly. This approach simplifies extension
         of decorator classes.
         """
-        command_text_sub = text_status.current_command[1:]
+        return self._select(text_status, text_status.current_command, self.sub_command.execute, ())
+
+    def compile(self, command_text: str, groups: Dict[str, str] = None) -> CompiledStep:
+        return self._select, (command_text,) + self.sub_command.compile(command_text[1:], groups)
+
+    def _select(self, text_status: TextStatus, command_text: str,
+                sub_handler: Callable[..., TextStatus], sub_arguments: tuple) -> TextStatus:
+        if text_status.cursors is not None:
+            return self._select_cursors(text_status, command_text)
+        command_text_sub = command_text[1:]
         start_pos_sub = text_status.end_position
         end_pos_sub = text_status.end_position+1
-        text_status_sub = TextStatus(text_status.current_text,
-                                     command_text_sub,
-                                     start_pos_sub,
-                                     end_pos_sub
-                                     )
+        text_status_sub = TextStatus.from_shared(text_status.shared_text,
+                                                 command_text_sub,
+                                                 start_pos_sub,
+                                                 end_pos_sub
+                                                 )
         # run navigation command
-        text_status_new = self.sub_command.execute(text_status_sub)
+        text_status_new = sub_handler(text_status_sub, *sub_arguments)
 
         # update the new text status
         if text_status_new.end_position < text_status.start_position:
             text_status_new.end_position = text_status.end_position
         else:
             text_status_new.start_position = text_status.start_position
-        text_status_new.current_command = text_status.current_command
+        text_status_new.current_command = command_text
 
         return text_status_new
 
+    def _select_cursors(self, text_status: TextStatus, command_text: str) -> TextStatus:
+        # extend every selection at once, as _select does for one
+        import numpy as np
+
+        starts, ends = text_status.cursors
+        new_starts, new_ends = self.sub_command.move_cursors(text_status.shared_text, command_text[1:],
+                                                             ends, ends + 1)
+        before = new_ends < starts
+        return TextStatus.from_cursors(text_status.shared_text, command_text,
+                                       Cursors.of(np.where(before, new_starts, starts),
+                                                  np.where(before, ends, new_ends)))
+
+    def accepts(self, command_text: str) -> bool:
+        return self.sub_command.accepts(command_text[1:])
+
     def validate(self, command_text: str) -> bool:
-        if super().validate(command_text):
+        if self._re.search(command_text):
             return self.sub_command.validate(command_text[1:])
         return False
+
+
+class MacroCommand(Command):
+    """
+    Record commands into a register with 'q<register>' ... 'q', and play
+    them back with '@<register>', optionally count times ('3@a'). Playback
+    runs the compiled macro and leaves a single history entry.
+    """
+
+    COMMAND_RECORD = 'q'
+    COMMAND_PLAY = '@'
+
+    _pattern = r'q[a-z]?|(?:[1-9][0-9]*(?![0-9]))?@[a-z]'
+    _re = re.compile(r'^(?:%s)$' % _pattern)
+
+    def __init__(self, macros: MacroRegisters) -> None:
+        self._macros = macros
+        super().__init__()
+
+    @property
+    def macros(self) -> MacroRegisters:
+        return self._macros
+
+    def execute(self, text_status: TextStatus) -> TextStatus:
+        cur_command = text_status.current_command
+        if cur_command[0] == MacroCommand.COMMAND_RECORD:
+            if len(cur_command) > 1:
+                self._macros.start(cur_command[1])
+            else:
+                self._macros.stop()
+            return TextStatus.from_shared(text_status.shared_text, cur_command,
+                                          text_status.start_position, text_status.end_position,
+                                          text_status.cursors)
+
+        count, play = NavigationCommand.split_count(cur_command)
+        return self._play(text_status, cur_command, count, self._macros.get(play[1]))
+
+    def compile(self, command_text: str, groups: Dict[str, str] = None) -> CompiledStep:
+        if command_text[0] == MacroCommand.COMMAND_RECORD:
+            return super().compile(command_text, groups)
+        # a macro played inside a recording is inlined as it is now
+        count, play = NavigationCommand.split_count(command_text)
+        return self._play, (command_text, count, self._macros.get(play[1]))
+
+    def recordable(self, command_text: str) -> bool:
+        return command_text[0] != MacroCommand.COMMAND_RECORD
+
+    def pushes_history(self, command_text: str) -> bool:
+        # starting and stopping a recording leave the text status as it is
+        return command_text[0] != MacroCommand.COMMAND_RECORD
+
+    @staticmethod
+    def _play(text_status: TextStatus, cur_command: str, count: int, macro: CompiledMacro) -> TextStatus:
+        text_status_new = text_status
+        if macro is not None:
+            for _ in range(count):
+                text_status_new = macro.run(text_status_new)
+        return TextStatus.from_shared(text_status_new.shared_text, cur_command,
+                                      text_status_new.start_position, text_status_new.end_position,
+                                      text_status_new.cursors)
+
+
+class MultiCursorCommand(Command):
+    """
+    '*t<char>' puts a cursor on the character before every occurrence of
+    char (case-insensitive) in the whole text, except one at offset 0, not
+    only on those after the current position. Navigation and selection
+    commands then move all the cursors at once; '*' keeps the primary
+    (first) cursor only.
+    """
+
+    COMMAND_CURSORS = '*'
+
+    _pattern = r'\*(?:t.)?'
+    _re = re.compile(r'^(?:%s)$' % _pattern)
+
+    def execute(self, text_status: TextStatus) -> TextStatus:
+        cur_command = text_status.current_command
+        cur_text = text_status.shared_text
+        if len(cur_command) == 1:
+            return TextStatus.from_shared(cur_text, cur_command, text_status.start_position, text_status.end_position)
+
+        import numpy as np
+
+        # an occurrence at offset 0 has no character before it
+        matched = np.array(cur_text.index.char_positions(cur_command[2]), dtype=np.int64)
+        matched = matched[matched > 0]
+        if not len(matched):
+            # nothing to put cursors on, stay
+            return TextStatus.from_shared(cur_text, cur_command, text_status.start_position,
+                                          text_status.end_position, text_status.cursors)
+        return TextStatus.from_cursors(cur_text, cur_command, Cursors.of(matched - 1, matched))
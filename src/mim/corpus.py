@@ -0,0 +1,99 @@
+import io
+import os
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from commands import AppCommand, SessionClosed
+from main import config_app, run_script
+from ui import MimUI, StreamMimUI
+
+
+class DocumentResult(NamedTuple):
+    path: str
+    # (start_pos, end_pos) after every recognized command
+    spans: List[Tuple[int, int]]
+    # number of commands that were not recognized
+    errors: int
+    seconds: float
+    worker: int
+
+
+class WorkerTiming(NamedTuple):
+    documents: int
+    seconds: float
+
+
+class CorpusRunner:
+    """
+    Run one command script over every document of a directory, sharded
+    across a process pool. Each document gets its own MimApp, loaded from
+    a memory-mapped file. Results are streamed back in document order.
+    """
+
+    def __init__(self, commands: List[str], processes: int = None, chunksize: int = 1) -> None:
+        self._script = ''.join(command + '\n' for command in commands)
+        self._processes = processes
+        self._chunksize = chunksize
+        self._worker_timings: Dict[int, WorkerTiming] = {}
+
+    @property
+    def worker_timings(self) -> Dict[int, WorkerTiming]:
+        """
+        documents processed and seconds spent per worker process id, for the last run
+        """
+        return dict(self._worker_timings)
+
+    def run(self, directory: str) -> Iterator[DocumentResult]:
+        self._worker_timings = {}
+        paths = CorpusRunner.list_documents(directory)
+        with Pool(self._processes, initializer=_init_worker, initargs=(self._script,)) as pool:
+            for result in pool.imap(_run_document, paths, self._chunksize):
+                documents, seconds = self._worker_timings.get(result.worker, (0, 0.0))
+                self._worker_timings[result.worker] = WorkerTiming(documents + 1, seconds + result.seconds)
+                yield result
+
+    @staticmethod
+    def list_documents(directory: str) -> List[str]:
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files))
+        return paths
+
+
+# command script shared by all documents of a worker, set by the pool initializer
+_worker_script: str = None
+
+
+def _init_worker(script: str):
+    global _worker_script
+    _worker_script = script
+
+
+def _run_document(path: str) -> DocumentResult:
+    started = time.perf_counter()
+    output = io.StringIO()
+    errors = io.StringIO()
+    mim_app = config_app(StreamMimUI(io.StringIO(_worker_script), output, errors),
+                         exit_handler=AppCommand.close_session)
+    try:
+        run_script(mim_app, input_file=path)
+    except SessionClosed:
+        # 'bye' ends the script of this document only
+        pass
+    finally:
+        # a worker runs many documents, each mapping is released once its document is done
+        mim_app.close()
+
+    spans = []
+    for line in output.getvalue().splitlines():
+        # the primary selection of a multi-cursor status comes first
+        start_pos, end_pos = line.split()[:2]
+        spans.append((int(start_pos), int(end_pos)))
+    return DocumentResult(path=path,
+                          spans=spans,
+                          # other messages, e.g. of AppCommand, go to the same stream
+                          errors=errors.getvalue().splitlines().count(MimUI.ERROR_COMMAND_NOT_RECOGNIZABLE),
+                          seconds=time.perf_counter() - started,
+                          worker=os.getpid())
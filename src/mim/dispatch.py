@@ -0,0 +1,59 @@
+import re
+from typing import List, Match, Optional, Tuple
+
+from commands import Command
+from macro import CompiledStep
+
+
+class CommandDispatcher:
+    """
+    Resolve command texts to commands with one combined regex, built once
+    from the patterns of the registered commands. Commands are tried in
+    registration order, as with Command.validate; a matched text must also
+    pass the checks of Command.accepts. The named groups of every pattern
+    are renamed apart, so that the same match also parses the command text.
+    """
+
+    _GROUP = re.compile(r'\(\?P<(\w+)>')
+
+    def __init__(self, commands: List[Command]) -> None:
+        self._commands: List[Command] = list(commands)
+        # per command: (group name in the combined regex, name in the command pattern)
+        self._groups: List[List[Tuple[str, str]]] = []
+        patterns = []
+        for i, command in enumerate(self._commands):
+            prefix = 'c%d_' % i
+            patterns.append(r'(?P<c%d>%s)' % (i, CommandDispatcher._GROUP.sub(r'(?P<%s\1>' % prefix, command.pattern)))
+            self._groups.append([(prefix + name, name) for name in CommandDispatcher._GROUP.findall(command.pattern)])
+        self._re = re.compile('|'.join(patterns))
+
+    def resolve(self, command_text: str) -> Optional[Tuple[Command, Match]]:
+        """
+        return the command accepting command_text and the parsed command text,
+        None if no command accepts it
+        """
+        matched = self._match(command_text)
+        if matched is None:
+            return None
+        return self._commands[matched[0]], matched[1]
+
+    def compile(self, command_text: str) -> Optional[Tuple[Command, CompiledStep]]:
+        """
+        return the command accepting command_text and its compiled step, built
+        from the named groups of the match, None if no command accepts it
+        """
+        matched = self._match(command_text)
+        if matched is None:
+            return None
+        i, match = matched
+        command = self._commands[i]
+        return command, command.compile(command_text, {name: match.group(group) for group, name in self._groups[i]})
+
+    def _match(self, command_text: str) -> Optional[Tuple[int, Match]]:
+        match = self._re.fullmatch(command_text)
+        if match is None:
+            return None
+        i = int(match.lastgroup[1:])
+        if not self._commands[i].accepts(command_text):
+            return None
+        return i, match
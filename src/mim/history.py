@@ -0,0 +1,285 @@
+import sys
+from collections import deque
+from typing import Deque, Iterator, List
+
+from shared_text import SharedText
+from util import Cursors, TextStatus
+
+
+class _Node:
+    """
+    One state of the undo tree: its change from the parent state and the
+    command text. Children are a doubly-linked sibling list, newest first;
+    redo is the child last left by an undo, or last added.
+    """
+
+    __slots__ = ('parent', 'first_child', 'prev_sibling', 'next_sibling', 'redo',
+                 'd_start', 'd_end', 'command', 'shared_text', 'cursors')
+
+    def __init__(self, parent: '_Node', d_start: int, d_end: int, command: str,
+                 shared_text: SharedText, cursors: Cursors) -> None:
+        self.parent = parent
+        self.first_child: _Node = None
+        self.prev_sibling: _Node = None
+        self.next_sibling: _Node = None
+        self.redo: _Node = None
+        self.d_start = d_start
+        self.d_end = d_end
+        self.command = command
+        # None once the node is removed from the tree
+        self.shared_text = shared_text
+        self.cursors = cursors
+
+
+class CommandHistory:
+    """
+    Undo tree of text statuses, used by the revert ('z'), redo ('Z') and
+    branch switching ('z-', 'z+') commands.
+
+    A new status becomes a child of the current one, so states left by an
+    undo stay reachable: redo follows the child last visited, and switching
+    moves to the older or newer sibling branch. Each node only records the
+    cursor/selection change from its parent and the command text; the
+    absolute positions are kept for the current node alone, so every step
+    is O(1). Nodes reference the shared text, so the size does not depend on
+    text length; cursor arrays are only held by multi-cursor nodes.
+
+    Once the estimated size exceeds ``max_bytes`` the oldest nodes are
+    pruned, the current one excepted: the children of a pruned node take
+    its place, with its change folded into theirs, so the remaining states
+    keep their positions.
+    """
+
+    DEFAULT_MAX_BYTES: int = 16 * 1024 * 1024
+
+    # estimated bytes of a node, its delta ints and its slot in the pruning queue
+    _NODE_SIZE: int = sys.getsizeof(_Node(None, 0, 0, None, None, None)) + 2 * sys.getsizeof(1 << 10) + 8
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self._max_bytes = max_bytes
+
+        # parent of the oldest states, its children hold absolute positions
+        self._root = _Node(None, 0, 0, None, None, None)
+        self._current: _Node = None
+        # absolute positions of the current node
+        self._top: TextStatus = None
+        # nodes in creation order, removed ones are dropped lazily
+        self._nodes: Deque[_Node] = deque()
+        self._length = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        """
+        number of states held, on every branch
+        """
+        return self._length
+
+    def __iter__(self) -> Iterator[TextStatus]:
+        """
+        every state from the oldest ancestor of the current one to the current one
+        """
+        path: List[_Node] = []
+        node = self._current
+        while node is not None and node is not self._root:
+            path.append(node)
+            node = node.parent
+        start_pos = end_pos = 0
+        for node in reversed(path):
+            start_pos += node.d_start
+            end_pos += node.d_end
+            yield TextStatus.from_shared(node.shared_text, node.command, start_pos, end_pos, node.cursors)
+
+    @property
+    def size(self) -> int:
+        """
+        estimated memory held by the history, in bytes
+        """
+        return self._size
+
+    @property
+    def current(self) -> TextStatus:
+        """
+        status of the current state, None if the history is empty
+        """
+        if self._current is None:
+            return None
+        return self._status()
+
+    def append(self, text_status: TextStatus):
+        """
+        add text_status as a new child of the current state, and make it current
+        """
+        command = text_status.current_command
+        if command is not None:
+            command = sys.intern(command)
+        parent = self._current or self._root
+        if self._current is None:
+            d_start, d_end = text_status.start_position, text_status.end_position
+        else:
+            d_start = text_status.start_position - self._top.start_position
+            d_end = text_status.end_position - self._top.end_position
+        node = _Node(parent, d_start, d_end, command, text_status.shared_text, text_status.cursors)
+
+        node.next_sibling = parent.first_child
+        if parent.first_child is not None:
+            parent.first_child.prev_sibling = node
+        parent.first_child = node
+        parent.redo = node
+
+        self._nodes.append(node)
+        self._length += 1
+        self._size += CommandHistory._node_size(node)
+        self._move_to(node, text_status.start_position, text_status.end_position)
+
+        self._prune()
+
+    def undo(self) -> TextStatus:
+        """
+        move to the parent state and return its status; None at the oldest state
+        """
+        node = self._current
+        if node is None or node.parent is self._root:
+            return None
+        node.parent.redo = node
+        self._move_to(node.parent, self._top.start_position - node.d_start, self._top.end_position - node.d_end)
+        return self._status()
+
+    def redo(self) -> TextStatus:
+        """
+        move to the child state last visited and return its status; None if there is none
+        """
+        node = self._current.redo if self._current is not None else None
+        if node is None:
+            return None
+        self._move_to(node, self._top.start_position + node.d_start, self._top.end_position + node.d_end)
+        return self._status()
+
+    def older_branch(self) -> TextStatus:
+        """
+        move to the sibling state made before the current one; None if there is none
+        """
+        return self._switch_branch(self._current.next_sibling if self._current is not None else None)
+
+    def newer_branch(self) -> TextStatus:
+        """
+        move to the sibling state made after the current one; None if there is none
+        """
+        return self._switch_branch(self._current.prev_sibling if self._current is not None else None)
+
+    def pop(self) -> TextStatus:
+        """
+        discard the current state with the states below it and return its status;
+        its parent, or the newest remaining oldest state, becomes current
+        """
+        node = self._current
+        if node is None:
+            raise IndexError('pop from empty history')
+        popped = self._status()
+        parent = node.parent
+        start_pos, end_pos = self._top.start_position - node.d_start, self._top.end_position - node.d_end
+
+        self._unlink(node)
+        if parent.redo is node:
+            parent.redo = None
+        self._remove_subtree(node)
+
+        if parent is not self._root:
+            self._move_to(parent, start_pos, end_pos)
+        elif parent.first_child is not None:
+            self._move_to(parent.first_child, parent.first_child.d_start, parent.first_child.d_end)
+        else:
+            self._current = self._top = None
+        return popped
+
+    def _switch_branch(self, sibling: _Node) -> TextStatus:
+        if sibling is None:
+            return None
+        node = self._current
+        self._move_to(sibling,
+                      self._top.start_position - node.d_start + sibling.d_start,
+                      self._top.end_position - node.d_end + sibling.d_end)
+        return self._status()
+
+    def _move_to(self, node: _Node, start_pos: int, end_pos: int):
+        self._current = node
+        self._top = TextStatus.from_shared(node.shared_text, node.command, start_pos, end_pos)
+
+    def _status(self) -> TextStatus:
+        # a new status each time, callers may change it
+        return TextStatus.from_shared(self._top.shared_text, self._top.current_command,
+                                      self._top.start_position, self._top.end_position, self._current.cursors)
+
+    def _prune(self):
+        while self._size > self._max_bytes and self._length > 1:
+            node = self._nodes.popleft()
+            if node.shared_text is None:
+                continue
+            if node is self._current:
+                self._nodes.append(node)
+                continue
+            self._remove_node(node)
+        # drop the removed nodes still queued once they outnumber the live ones
+        if len(self._nodes) > 2 * self._length + 16:
+            self._nodes = deque(node for node in self._nodes if node.shared_text is not None)
+
+    def _remove_node(self, node: _Node):
+        """
+        remove node from the tree, its children take its place among its siblings
+        """
+        parent = node.parent
+        child = last_child = node.first_child
+        while child is not None:
+            # fold the change of node into its children, their absolute positions stay
+            child.parent = parent
+            child.d_start += node.d_start
+            child.d_end += node.d_end
+            last_child = child
+            child = child.next_sibling
+
+        if node.first_child is None:
+            self._unlink(node)
+        else:
+            first_child = node.first_child
+            first_child.prev_sibling = node.prev_sibling
+            last_child.next_sibling = node.next_sibling
+            if node.prev_sibling is None:
+                parent.first_child = first_child
+            else:
+                node.prev_sibling.next_sibling = first_child
+            if node.next_sibling is not None:
+                node.next_sibling.prev_sibling = last_child
+        if parent.redo is node:
+            parent.redo = node.redo
+        self._release(node)
+
+    def _remove_subtree(self, node: _Node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            child = node.first_child
+            while child is not None:
+                stack.append(child)
+                child = child.next_sibling
+            self._release(node)
+
+    @staticmethod
+    def _unlink(node: _Node):
+        if node.prev_sibling is None:
+            node.parent.first_child = node.next_sibling
+        else:
+            node.prev_sibling.next_sibling = node.next_sibling
+        if node.next_sibling is not None:
+            node.next_sibling.prev_sibling = node.prev_sibling
+
+    def _release(self, node: _Node):
+        self._length -= 1
+        self._size -= CommandHistory._node_size(node)
+        node.parent = node.first_child = node.prev_sibling = node.next_sibling = node.redo = None
+        node.shared_text = node.cursors = None
+
+    @staticmethod
+    def _node_size(node: _Node) -> int:
+        # the command string is interned and the text shared, neither is counted
+        if node.cursors is None:
+            return CommandHistory._NODE_SIZE
+        return CommandHistory._NODE_SIZE + node.cursors.nbytes
@@ -0,0 +1,279 @@
+import os
+import struct
+import threading
+import zlib
+from array import array
+from typing import BinaryIO, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from buffer import MmapBuffer, TextBuffer
+from util import TextStatus
+
+
+class JournalText(NamedTuple):
+    # TEXT_INLINE: value is the text itself, TEXT_FILE: value is the path of a memory-mapped file
+    kind: int
+    value: str
+
+
+class JournalEntry(NamedTuple):
+    # index into JournalState.texts
+    text_no: int
+    # command text as dispatched, None for a text load
+    command: str
+    start_pos: int
+    end_pos: int
+
+
+class JournalState(NamedTuple):
+    # every text loaded in the session, in order
+    texts: List[JournalText]
+    # history at the latest checkpoint, bottom to top
+    checkpoint: List[JournalEntry]
+    # text loads and executed commands after the checkpoint
+    records: List[JournalEntry]
+    # bytes of complete records, anything after is a torn write
+    valid_length: int
+
+
+class Journal:
+    """
+    Append-only binary journal of a session: every loaded text (inline, or
+    the path of a memory-mapped file), every executed command with its
+    resulting positions and, every checkpoint_interval commands, a snapshot
+    of the whole history so that recovery only replays the records after it.
+
+    Records are a (type, payload length, CRC-32) header and the payload.
+    Every record is flushed to the OS, so a crash of the process loses
+    nothing; a timer fsyncs them sync_interval seconds after the first
+    unsynced one (0 syncs every record), which bounds what a crash of the
+    system loses. A torn last record is detected by its length or checksum
+    and dropped. At every checkpoint the journal is rewritten to the texts
+    still referenced and the snapshot, so it does not grow with the session.
+    """
+
+    MAGIC = b'MIMJ\x01'
+
+    RECORD_TEXT = 1
+    RECORD_COMMAND = 2
+    RECORD_CHECKPOINT = 3
+
+    TEXT_INLINE = 0
+    TEXT_FILE = 1
+
+    DEFAULT_SYNC_INTERVAL: float = 1.0
+    DEFAULT_CHECKPOINT_INTERVAL: int = 1024
+
+    _header = struct.Struct('<BII')
+    _text = struct.Struct('<B')
+    _command = struct.Struct('<qq')
+    _checkpoint = struct.Struct('<II')
+
+    def __init__(self, path: str, sync_interval: float = DEFAULT_SYNC_INTERVAL,
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> None:
+        if checkpoint_interval < 1:
+            raise ValueError('checkpoint_interval must be positive')
+        self._path = path
+        self._sync_interval = sync_interval
+        self._checkpoint_interval = checkpoint_interval
+
+        # an existing journal is kept for recover(), without its torn tail if any
+        self.recovered: JournalState = None
+        if os.path.exists(path) and os.path.getsize(path):
+            self.recovered = read_journal(path)
+        self._file: BinaryIO = open(path, 'r+b' if self.recovered is not None else 'wb')
+        if self.recovered is not None:
+            self._file.truncate(self.recovered.valid_length)
+            self._file.seek(self.recovered.valid_length)
+        else:
+            self._file.write(Journal.MAGIC)
+
+        # text number by id(text); the texts are kept referenced so that ids stay unique
+        self._texts: List[Union[str, TextBuffer]] = []
+        self._text_numbers: Dict[int, int] = {}
+        self._commands_since_checkpoint = 0
+        # pending fsync, the lock keeps it off a file being closed or replaced
+        self._sync_timer: threading.Timer = None
+        self._lock = threading.Lock()
+
+    @property
+    def checkpoint_due(self) -> bool:
+        return self._commands_since_checkpoint >= self._checkpoint_interval
+
+    def restore_texts(self, texts: Iterable[Union[str, TextBuffer]]):
+        """
+        number the texts of a recovered journal, in their original order, without writing them again
+        """
+        for text in texts:
+            self._register(text)
+
+    def write_text(self, text: Union[str, TextBuffer]):
+        self._register(text)
+        self._write(Journal.RECORD_TEXT, Journal._text_payload(text))
+
+    def write_command(self, command_text: str, text_status: TextStatus):
+        self._write(Journal.RECORD_COMMAND,
+                    Journal._command.pack(text_status.start_position, text_status.end_position)
+                    + command_text.encode('utf-8'))
+        self._commands_since_checkpoint += 1
+
+    def write_checkpoint(self, statuses: Iterable[TextStatus]):
+        """
+        snapshot of the history, from the oldest state to the current one; other
+        branches of the undo tree are not kept. The journal is replaced by the
+        texts the snapshot references, the last loaded one, and the snapshot.
+        """
+        statuses = list(statuses)
+        referenced = {id(text_status.current_text) for text_status in statuses}
+        texts = [text for text in self._texts if id(text) in referenced or text is self._texts[-1]]
+        # renumbered, unreferenced texts are released
+        self._texts, self._text_numbers = [], {}
+        for text in texts:
+            self._register(text)
+
+        commands: Dict[str, int] = {}
+        text_nos, command_ids, starts, ends = array('q'), array('q'), array('q'), array('q')
+        for text_status in statuses:
+            text_nos.append(self._text_numbers[id(text_status.current_text)])
+            command = text_status.current_command
+            command_ids.append(-1 if command is None else commands.setdefault(command, len(commands)))
+            starts.append(text_status.start_position)
+            ends.append(text_status.end_position)
+
+        command_table = '\n'.join(commands).encode('utf-8')
+        payload = b''.join((Journal._checkpoint.pack(len(starts), len(command_table)), command_table,
+                            text_nos.tobytes(), command_ids.tobytes(), starts.tobytes(), ends.tobytes()))
+        self._rewrite([Journal._record(Journal.RECORD_TEXT, Journal._text_payload(text)) for text in texts]
+                      + [Journal._record(Journal.RECORD_CHECKPOINT, payload)])
+        self._commands_since_checkpoint = 0
+
+    def sync(self):
+        with self._lock:
+            self._cancel_sync()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self) -> 'Journal':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _register(self, text: Union[str, TextBuffer]):
+        self._text_numbers[id(text)] = len(self._texts)
+        self._texts.append(text)
+
+    def _write(self, record_type: int, payload: bytes):
+        self._file.write(Journal._record(record_type, payload))
+        self._file.flush()
+        if self._sync_interval <= 0:
+            self.sync()
+            return
+        with self._lock:
+            if self._sync_timer is None:
+                self._sync_timer = threading.Timer(self._sync_interval, self._sync_pending)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+
+    def _sync_pending(self):
+        with self._lock:
+            self._sync_timer = None
+            if not self._file.closed:
+                os.fsync(self._file.fileno())
+
+    def _cancel_sync(self):
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+
+    def _rewrite(self, records: List[bytes]):
+        # written aside and renamed over the journal, a crash leaves either one complete
+        new_path = self._path + '.new'
+        with open(new_path, 'wb') as new_file:
+            new_file.write(Journal.MAGIC)
+            for record in records:
+                new_file.write(record)
+            new_file.flush()
+            os.fsync(new_file.fileno())
+        with self._lock:
+            self._cancel_sync()
+            self._file.close()
+            os.replace(new_path, self._path)
+            self._file = open(self._path, 'ab')
+
+    @staticmethod
+    def _record(record_type: int, payload: bytes) -> bytes:
+        return Journal._header.pack(record_type, len(payload), zlib.crc32(payload)) + payload
+
+    @staticmethod
+    def _text_payload(text: Union[str, TextBuffer]) -> bytes:
+        if isinstance(text, MmapBuffer):
+            kind, value = Journal.TEXT_FILE, os.path.abspath(text.path)
+        else:
+            kind, value = Journal.TEXT_INLINE, str(text)
+        return Journal._text.pack(kind) + value.encode('utf-8', errors='surrogateescape')
+
+
+def read_journal(path: str) -> JournalState:
+    """
+    read a journal up to its last complete record; only the records after
+    the latest checkpoint are decoded, besides the texts
+    """
+    with open(path, 'rb') as journal_file:
+        data = journal_file.read()
+    if not data.startswith(Journal.MAGIC):
+        raise ValueError(f'not a mim journal: {path}')
+
+    # first pass: validate the records and find the latest checkpoint, without decoding them
+    header = Journal._header
+    records: List[Tuple[int, int, int]] = []
+    offset = len(Journal.MAGIC)
+    checkpoint = -1
+    while offset + header.size <= len(data):
+        record_type, length, crc = header.unpack_from(data, offset)
+        payload_start = offset + header.size
+        if payload_start + length > len(data) or zlib.crc32(data[payload_start:payload_start + length]) != crc:
+            break
+        if record_type == Journal.RECORD_CHECKPOINT:
+            checkpoint = len(records)
+        records.append((record_type, payload_start, length))
+        offset = payload_start + length
+
+    texts: List[JournalText] = []
+    checkpoint_entries: List[JournalEntry] = []
+    entries: List[JournalEntry] = []
+    for i, (record_type, start, length) in enumerate(records):
+        if record_type == Journal.RECORD_TEXT:
+            kind, = Journal._text.unpack_from(data, start)
+            value = data[start + Journal._text.size:start + length].decode('utf-8', errors='surrogateescape')
+            texts.append(JournalText(kind, value))
+            if i > checkpoint:
+                entries.append(JournalEntry(len(texts) - 1, None, 0, 0))
+        elif i == checkpoint:
+            checkpoint_entries = _decode_checkpoint(data, start)
+        elif record_type == Journal.RECORD_COMMAND and i > checkpoint:
+            start_pos, end_pos = Journal._command.unpack_from(data, start)
+            command = data[start + Journal._command.size:start + length].decode('utf-8')
+            entries.append(JournalEntry(len(texts) - 1, command, start_pos, end_pos))
+    return JournalState(texts, checkpoint_entries, entries, offset)
+
+
+def _decode_checkpoint(data: bytes, start: int) -> List[JournalEntry]:
+    count, table_length = Journal._checkpoint.unpack_from(data, start)
+    start += Journal._checkpoint.size
+    commands = data[start:start + table_length].decode('utf-8').split('\n') if table_length else []
+    start += table_length
+
+    columns = []
+    for _ in range(4):
+        column = array('q')
+        column.frombytes(data[start:start + count * column.itemsize])
+        columns.append(column)
+        start += count * column.itemsize
+    text_nos, command_ids, starts, ends = columns
+    return [JournalEntry(text_nos[i], None if command_ids[i] < 0 else commands[command_ids[i]], starts[i], ends[i])
+            for i in range(count)]
@@ -0,0 +1,74 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+from util import TextStatus
+
+# handler(text_status, *arguments) -> TextStatus, see Command.compile
+CompiledStep = Tuple[Callable[..., TextStatus], tuple]
+
+
+class CompiledMacro:
+    """
+    Recorded command sequence, parsed once into handlers and their
+    arguments. Running it applies the steps one after the other without
+    dispatching, validating, rendering or pushing history in between.
+    """
+
+    __slots__ = ('_command_texts', '_steps')
+
+    def __init__(self, command_texts: List[str], steps: List[CompiledStep]) -> None:
+        self._command_texts = command_texts
+        self._steps = steps
+
+    @property
+    def command_texts(self) -> List[str]:
+        return list(self._command_texts)
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def run(self, text_status: TextStatus) -> TextStatus:
+        for handler, arguments in self._steps:
+            text_status = handler(text_status, *arguments)
+        return text_status
+
+
+class MacroRegisters:
+    """
+    Named macros and the recording in progress, if any. Commands are
+    recorded as executed, with the command that handled them, and compiled
+    when the recording stops.
+    """
+
+    def __init__(self) -> None:
+        self._macros: Dict[str, CompiledMacro] = {}
+        self._recording: str = None
+        # (command, command text) recorded so far
+        self._recorded: List[Tuple[Any, str]] = []
+
+    @property
+    def recording(self) -> str:
+        """
+        register being recorded, None if not recording
+        """
+        return self._recording
+
+    def get(self, register: str) -> CompiledMacro:
+        return self._macros.get(register)
+
+    def start(self, register: str):
+        self._recording = register
+        self._recorded = []
+
+    def record(self, command, command_text: str):
+        if self._recording is not None and command.recordable(command_text):
+            self._recorded.append((command, command_text))
+
+    def stop(self) -> CompiledMacro:
+        if self._recording is None:
+            return None
+        macro = CompiledMacro([command_text for _, command_text in self._recorded],
+                              [command.compile(command_text) for command, command_text in self._recorded])
+        self._macros[self._recording] = macro
+        self._recording = None
+        self._recorded = []
+        return macro
@@ -1,40 +1,223 @@
-from typing import List
+import argparse
+import sys
+from typing import Callable, Union
 
-from commands import NavigationCommand, AppCommand, SelectionCommand
+from buffer import PieceTable, TextBuffer
+from commands import NavigationCommand, AppCommand, SelectionCommand, MacroCommand, MultiCursorCommand, SessionClosed
+from history import CommandHistory
+from journal import Journal
+from macro import MacroRegisters
+from suffix_array import SuffixArrayCache
+from metrics import Metrics
 from mim_app import MimApp
-from ui import SimpleMimUI, MimUI
-from util import TextStatus
+from ui import SimpleMimUI, MimUI, StreamMimUI
 
+# text buffer implementations selectable with --buffer
+TEXT_BUFFERS = {
+    'str': None,
+    'piece-table': PieceTable,
+}
 
-def main():
 
-    mim_app = config_app()
+def main(argv=None):
 
-    # collect the input text
-    mim_app.input_text()
+    args = parse_args(argv)
+    if args.listen or args.socket:
+        run_server(args)
+        return
+    if args.corpus:
+        run_corpus(args)
+        return
+    if args.script:
+        run_headless(args)
+        return
 
-    # input and execute commands
-    while True:
-        if mim_app.get_command(mim_app.input_command()):
+    metrics = create_metrics(args)
+    journal = Journal(args.journal, args.sync_interval) if args.journal else None
+    mim_app = config_app(SimpleMimUI(args.max_input_length, args.viewport), text_buffer=TEXT_BUFFERS[args.buffer],
+                         cache_size=args.cache_size, metrics=metrics, journal=journal,
+                         suffix_arrays=create_suffix_arrays(args))
+
+    try:
+        # continue the journaled session if any, collect the input text otherwise
+        if mim_app.recover():
+            mim_app.output_current_text_status()
+        elif args.file:
+            mim_app.input_file(args.file)
+        else:
+            mim_app.input_text()
+
+        # input and execute commands
+        while True:
+            if mim_app.get_command(mim_app.input_command()):
+                mim_app.execute()
+                mim_app.output_current_text_status()
+            else:
+                mim_app.output_text(MimUI.ERROR_COMMAND_NOT_RECOGNIZABLE)
+    finally:
+        # 'bye' exits through SystemExit, metrics and journal are written on the way out
+        close_metrics(metrics, args)
+        if journal is not None:
+            journal.close()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='A simple VIM implementation')
+    parser.add_argument('--script', metavar='PATH',
+                        help='run headless: read commands from PATH ("-" for stdin), one per line; '
+                             'the first line is the input text unless --text or --file is given')
+    parser.add_argument('--text', metavar='PATH', help='read the input text from PATH')
+    parser.add_argument('--file', metavar='PATH',
+                        help='memory-map the UTF-8 file PATH as the input text instead of reading it')
+    parser.add_argument('--output', metavar='PATH', help='write selection spans to PATH instead of stdout')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='run the --script commands over every file of DIR, in parallel processes')
+    parser.add_argument('--processes', type=int, help='number of --corpus worker processes, default: CPU count')
+    parser.add_argument('--listen', metavar='HOST:PORT', help='serve concurrent sessions over TCP')
+    parser.add_argument('--socket', metavar='PATH', help='serve concurrent sessions over a Unix socket')
+    parser.add_argument('--buffer', choices=sorted(TEXT_BUFFERS), default='str', help='text buffer implementation')
+    parser.add_argument('--cache-size', type=int, default=NavigationCommand.DEFAULT_CACHE_SIZE,
+                        help='navigation results to remember, 0 disables the cache')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='record per-command latency and allocations, written as JSON to PATH on exit')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='with --metrics, also count allocated bytes with tracemalloc (slower)')
+    parser.add_argument('--journal', metavar='PATH',
+                        help='journal the interactive session to PATH, and recover it from there on restart')
+    parser.add_argument('--sync-interval', type=float, default=Journal.DEFAULT_SYNC_INTERVAL,
+                        help='seconds between fsyncs of the journal, 0 syncs every command')
+    parser.add_argument('--suffix-array', action='store_true',
+                        help='index the input text with a suffix array for fast literal "/" search (needs NumPy)')
+    parser.add_argument('--suffix-array-cache', metavar='DIR',
+                        help='directory of cached suffix arrays, default: %s' % SuffixArrayCache.default_directory())
+    parser.add_argument('--max-input-length', type=int, default=SimpleMimUI.InputTextValidator.INPUT_MAX_LENGTH,
+                        help='maximum length of the interactive input text')
+    parser.add_argument('--viewport', type=int, default=SimpleMimUI.VIEWPORT,
+                        help='characters shown around the selection')
+    return parser.parse_args(argv)
+
+
+def run_headless(args: argparse.Namespace):
+    input_text = None
+    if args.text:
+        with open(args.text, encoding='utf-8') as text_file:
+            input_text = text_file.read()
+
+    script = sys.stdin if args.script == '-' else open(args.script, encoding='utf-8')
+    output = sys.stdout if args.output is None else open(args.output, 'w', encoding='utf-8')
+    metrics = create_metrics(args)
+    try:
+        # 'bye' ends the script quietly, nothing but spans is written to the output
+        run_script(config_app(StreamMimUI(script, output, sys.stderr, input_text),
+                              text_buffer=TEXT_BUFFERS[args.buffer], exit_handler=AppCommand.close_session,
+                              cache_size=args.cache_size, metrics=metrics,
+                              suffix_arrays=create_suffix_arrays(args)),
+                   input_file=args.file)
+    except SessionClosed:
+        pass
+    finally:
+        close_metrics(metrics, args)
+        output.flush()
+        if script is not sys.stdin:
+            script.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+def run_corpus(args: argparse.Namespace):
+    # imported here, the corpus runner builds on this module
+    from corpus import CorpusRunner
+
+    if not args.script:
+        raise SystemExit('--corpus requires --script')
+    script = sys.stdin if args.script == '-' else open(args.script, encoding='utf-8')
+    with script:
+        commands = [line.rstrip('\n') for line in script]
+
+    runner = CorpusRunner(commands, args.processes)
+    output = sys.stdout if args.output is None else open(args.output, 'w', encoding='utf-8')
+    try:
+        for result in runner.run(args.corpus):
+            for start_pos, end_pos in result.spans:
+                output.write(f'{result.path}\t{start_pos} {end_pos}\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    for worker, timing in sorted(runner.worker_timings.items()):
+        sys.stderr.write(f'worker {worker}: {timing.documents} documents in {timing.seconds:.3f}s\n')
+
+
+def run_server(args: argparse.Namespace):
+    # imported here, the server builds on this module
+    import asyncio
+    from server import serve
+
+    host, port = None, None
+    if args.listen:
+        host, _, port = args.listen.rpartition(':')
+        host, port = host or None, int(port)
+    asyncio.run(serve(host, port, args.socket))
+
+
+def create_metrics(args: argparse.Namespace) -> Metrics:
+    if not args.metrics:
+        return None
+    return Metrics(trace_memory=args.trace_memory)
+
+
+def create_suffix_arrays(args: argparse.Namespace) -> SuffixArrayCache:
+    if not args.suffix_array:
+        return None
+    return SuffixArrayCache(args.suffix_array_cache)
+
+
+def close_metrics(metrics: Metrics, args: argparse.Namespace):
+    if metrics is not None:
+        metrics.dump(args.metrics)
+        metrics.close()
+
+
+def run_script(mim_app: MimApp, input_file: str = None):
+    """
+    run every command of the UI input, without prompting
+    """
+    if input_file:
+        mim_app.input_file(input_file)
+    else:
+        mim_app.input_text()
+
+    command_text = mim_app.input_command()
+    while command_text is not None:
+        if mim_app.get_command(command_text):
             mim_app.execute()
             mim_app.output_current_text_status()
         else:
             mim_app.output_text(MimUI.ERROR_COMMAND_NOT_RECOGNIZABLE)
+        command_text = mim_app.input_command()
 
 
-def config_app() -> MimApp:
+def config_app(ui: MimUI = None, text_buffer: Callable[[str], Union[str, TextBuffer]] = None,
+               exit_handler: Callable[[], None] = None,
+               cache_size: int = NavigationCommand.DEFAULT_CACHE_SIZE, metrics: Metrics = None,
+               journal: Journal = None, suffix_arrays: SuffixArrayCache = None) -> MimApp:
     # stack to keep the text status history
-    command_history: List[TextStatus] = []
+    command_history = CommandHistory()
+
+    # config UI, commands write their messages to it
+    if ui is None:
+        ui = SimpleMimUI()
 
     # register commands
-    nav_command = NavigationCommand()
+    nav_command = NavigationCommand(cache_size)
     sel_command = SelectionCommand(nav_command)
-    app_command = AppCommand(command_history)
-    commands = [nav_command, sel_command, app_command]
+    macros = MacroRegisters()
+    app_command = AppCommand(command_history, exit_handler, ui.output_message, macros)
+    macro_command = MacroCommand(macros)
+    cursor_command = MultiCursorCommand()
+    commands = [nav_command, sel_command, app_command, macro_command, cursor_command]
 
-    # config UI
-    ui = SimpleMimUI()
-    return MimApp(commands, ui, command_history)
+    return MimApp(commands, ui, command_history, text_buffer, metrics, journal, macros, suffix_arrays)
 
 
 if __name__ == "__main__":
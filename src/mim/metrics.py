@@ -0,0 +1,105 @@
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, Tuple
+
+
+class PhaseStats:
+    """
+    Latency histogram and allocation totals of one phase for one command type.
+    Latencies are bucketed by powers of two nanoseconds.
+    """
+
+    __slots__ = ('count', 'total_ns', 'max_ns', 'buckets', 'allocated_blocks', 'allocated_bytes')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        # bit length of the latency in ns -> count, i.e. upper bound 2 ** key
+        self.buckets: Dict[int, int] = {}
+        # net blocks/bytes allocated by the phase, bytes only while tracemalloc is tracing
+        self.allocated_blocks = 0
+        self.allocated_bytes = 0
+
+    def add(self, elapsed_ns: int, blocks: int, size: int):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        bucket = elapsed_ns.bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.allocated_blocks += blocks
+        self.allocated_bytes += size
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_ns': self.total_ns,
+            'mean_ns': self.total_ns // self.count if self.count else 0,
+            'max_ns': self.max_ns,
+            'histogram_ns': {str(1 << bucket): count for bucket, count in sorted(self.buckets.items())},
+            'allocated_blocks': self.allocated_blocks,
+            'allocated_bytes': self.allocated_bytes,
+        }
+
+
+class Metrics:
+    """
+    Opt-in instrumentation of MimApp: latency and allocations per phase
+    (dispatch, execute, history push, render) and command type. MimApp only
+    calls into it when one is configured, so it costs nothing otherwise.
+    With trace_memory, tracemalloc is started to also count allocated bytes.
+    """
+
+    PHASE_DISPATCH = 'dispatch'
+    PHASE_EXECUTE = 'execute'
+    PHASE_HISTORY_PUSH = 'history_push'
+    PHASE_RENDER = 'render'
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self._stats: Dict[Tuple[str, str], PhaseStats] = {}
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def start(self) -> Tuple[int, int, int]:
+        """
+        mark the beginning of a phase, pass the result to record
+        """
+        size = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        return time.perf_counter_ns(), sys.getallocatedblocks(), size
+
+    def record(self, phase: str, command_type: str, started: Tuple[int, int, int]):
+        elapsed_ns = time.perf_counter_ns() - started[0]
+        blocks = sys.getallocatedblocks() - started[1]
+        size = tracemalloc.get_traced_memory()[0] - started[2] if tracemalloc.is_tracing() else 0
+
+        stats = self._stats.get((phase, command_type))
+        if stats is None:
+            stats = self._stats[(phase, command_type)] = PhaseStats()
+        stats.add(elapsed_ns, blocks, size)
+
+    def stats(self, phase: str, command_type: str) -> PhaseStats:
+        return self._stats.get((phase, command_type))
+
+    def snapshot(self) -> dict:
+        """
+        all recorded statistics as JSON-serializable {phase: {command type: stats}}
+        """
+        phases: Dict[str, dict] = {}
+        for (phase, command_type), stats in sorted(self._stats.items()):
+            phases.setdefault(phase, {})[command_type] = stats.to_dict()
+        return {'phases': phases}
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as metrics_file:
+            json.dump(self.snapshot(), metrics_file, indent=2)
+            metrics_file.write('\n')
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
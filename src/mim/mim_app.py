@@ -1,19 +1,99 @@
-from typing import List
+from typing import Callable, List, Optional, Tuple, Union
 
-from commands import Command
+from buffer import MmapBuffer, TextBuffer
+from commands import AppCommand, Command, MacroCommand
+from dispatch import CommandDispatcher
+from history import CommandHistory
+from journal import Journal, JournalText
+from macro import CompiledStep, MacroRegisters
+from metrics import Metrics
+from shared_text import SharedText, intern_text
+from suffix_array import SuffixArrayCache
 from ui import MimUI
 from util import TextStatus
 
 
 class MimApp:
 
-    def __init__(self, available_commands: List[Command], ui: MimUI, command_history: List[TextStatus]) -> None:
+    def __init__(self, available_commands: List[Command], ui: MimUI, command_history: CommandHistory,
+                 text_buffer: Callable[[str], Union[str, TextBuffer]] = None, metrics: Metrics = None,
+                 journal: Journal = None, macros: MacroRegisters = None,
+                 suffix_arrays: SuffixArrayCache = None) -> None:
         self._available_commands: List[Command] = available_commands
+        self._dispatcher: CommandDispatcher = CommandDispatcher(available_commands)
         self._ui: MimUI = ui
         self._cur_text_status: TextStatus = TextStatus(current_text="", current_command="")
         self._cur_command: Command
+        # handler and arguments parsed from the current command text by the dispatcher
+        self._cur_step: CompiledStep
 
-        self._command_history: List[TextStatus] = command_history
+        self._command_history: CommandHistory = command_history
+        # wraps the input text, e.g. PieceTable, the plain str is used by default
+        self._text_buffer = text_buffer
+        # opt-in instrumentation, every phase checks for None first
+        self._metrics: Metrics = metrics
+        # records loaded texts and executed commands for recover()
+        self._journal: Journal = journal
+        # executed commands are recorded into these while a macro is being recorded
+        self._macros: MacroRegisters = macros
+        # suffix arrays of the loaded texts for literal search, off by default
+        self._suffix_arrays: SuffixArrayCache = suffix_arrays
+        # memory-mapped files opened by the app, released by close()
+        self._files: List[MmapBuffer] = []
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._metrics
+
+    def recover(self) -> bool:
+        """
+        Rebuild history and current status from the records of the journal,
+        starting at its latest checkpoint; return False if it has none
+        """
+        state = self._journal.recovered if self._journal is not None else None
+        if state is None or not state.texts:
+            return False
+
+        texts = [self._open_journal_text(journal_text) for journal_text in state.texts]
+        self._journal.restore_texts(texts)
+        shared_texts = [self._intern_text(text) for text in texts]
+
+        history = self._command_history
+        moves = {AppCommand.COMMAND_REVERT: history.undo,
+                 AppCommand.COMMAND_REDO: history.redo,
+                 AppCommand.COMMAND_OLDER_BRANCH: history.older_branch,
+                 AppCommand.COMMAND_NEWER_BRANCH: history.newer_branch}
+        for entry in state.checkpoint:
+            history.append(TextStatus.from_shared(shared_texts[entry.text_no], entry.command,
+                                                  entry.start_pos, entry.end_pos))
+        recording = False
+        for entry in state.records:
+            shared_text = shared_texts[entry.text_no]
+            if entry.command is not None and entry.command[0] == MacroCommand.COMMAND_RECORD:
+                # 'q<register>' and 'q' leave no history entry, history commands in between were refused
+                recording = len(entry.command) > 1
+                continue
+            move = moves.get(entry.command)
+            if move is not None and recording:
+                continue
+            if move is not None:
+                # history commands are replayed on the tree, as in AppCommand
+                move()
+                current = history.current
+                if (current.shared_text is shared_text and current.start_position == entry.start_pos
+                        and current.end_position == entry.end_pos):
+                    continue
+                # the journaled target is off the checkpointed path, it is recovered as a new state
+            history.append(TextStatus.from_shared(shared_text, entry.command, entry.start_pos, entry.end_pos))
+        self._cur_text_status = history.current
+        return True
+
+    def _open_journal_text(self, journal_text: JournalText) -> Union[str, TextBuffer]:
+        if journal_text.kind == Journal.TEXT_FILE:
+            return self._open_file(journal_text.value)
+        if self._text_buffer is not None:
+            return self._text_buffer(journal_text.value)
+        return journal_text.value
 
     def input_text(self):
         """
@@ -21,14 +101,46 @@ class MimApp:
         """
         # gather text from user input
         input_text = self._ui.get_input_text()
+        if self._text_buffer is not None:
+            input_text = self._text_buffer(input_text)
+        self._load_text(input_text)
+
+    def input_file(self, path: str):
+        """
+        Load input text from a UTF-8 file, memory-mapped instead of read
+        """
+        self._load_text(self._open_file(path))
+
+    def close(self):
+        """
+        Close the memory-mapped files loaded so far; the statuses over them are not usable afterwards
+        """
+        for mmap_buffer in self._files:
+            mmap_buffer.close()
+        self._files = []
+
+    def _open_file(self, path: str) -> MmapBuffer:
+        mmap_buffer = MmapBuffer(path)
+        self._files.append(mmap_buffer)
+        return mmap_buffer
 
-        # save status
-        self._cur_text_status.current_text = input_text
-        self._cur_text_status.start_position = 0
-        self._cur_text_status.end_position = 0
-        self._cur_text_status.current_command = None
+    def _load_text(self, input_text: Union[str, TextBuffer]):
+        shared_text = self._intern_text(input_text)
+        if self._journal is not None:
+            self._journal.write_text(input_text)
+
+        # save status, a new one: earlier statuses may still be referenced by the history
+        self._cur_text_status = TextStatus.from_shared(shared_text, None, 0, 0)
         self._command_history.append(self._cur_text_status)
 
+    def _intern_text(self, input_text: Union[str, TextBuffer]) -> SharedText:
+        # intern the text and build its lookup tables once, navigation commands reuse them
+        shared_text = intern_text(input_text)
+        shared_text.build_index()
+        if self._suffix_arrays is not None and shared_text.suffix_array is None:
+            shared_text.suffix_array = self._suffix_arrays.get(input_text)
+        return shared_text
+
     def input_command(self):
         """
         gather command text from UI
@@ -40,11 +152,16 @@ class MimApp:
         find command by command text
         return None if no command found, command text is illegal
         """
-        command = self._find_command(command_text)
-        if command:
-            self._cur_command = command
+        if self._metrics is None:
+            resolved = self._find_command(command_text)
+        else:
+            started = self._metrics.start()
+            resolved = self._find_command(command_text)
+            self._metrics.record(Metrics.PHASE_DISPATCH, MimApp._command_type(resolved and resolved[0]), started)
+        if resolved:
+            self._cur_command, self._cur_step = resolved
             self._cur_text_status.current_command = command_text
-            return command
+            return self._cur_command
         else:
             return None  # validation failed, command doest not exist
 
@@ -52,30 +169,64 @@ class MimApp:
         """
         print current text status to UI
         """
+        if self._metrics is not None:
+            started = self._metrics.start()
+        cursors = self._cur_text_status.cursors
         self._ui.output_text(self._cur_text_status.current_text,
                              self._cur_text_status.start_position,
-                             self._cur_text_status.end_position
+                             self._cur_text_status.end_position,
+                             cursors.spans() if cursors is not None else None
                              )
+        if self._metrics is not None:
+            self._metrics.record(Metrics.PHASE_RENDER, MimApp._command_type(self._cur_command), started)
 
     def output_text(self, vaulue: str):
         """
         print information to UI
         """
-        self._ui.output_text(vaulue)
+        self._ui.output_message(vaulue)
 
     def execute(self):
         """
         run command and save text status to history, and
         refresh APP status
         """
-        text_status_new = self._cur_command.execute(self._cur_text_status)
+        command_text = self._cur_text_status.current_command
+        if self._metrics is not None:
+            self._execute_measured(command_text)
+        else:
+            handler, arguments = self._cur_step
+            text_status_new = handler(self._cur_text_status, *arguments)
+
+            # save status, unless the command moved in the history
+            if self._cur_command.pushes_history(command_text):
+                self._command_history.append(text_status_new)
+            self._cur_text_status = text_status_new
+
+        if self._macros is not None:
+            self._macros.record(self._cur_command, command_text)
+        if self._journal is not None:
+            self._journal.write_command(command_text, self._cur_text_status)
+            if self._journal.checkpoint_due:
+                self._journal.write_checkpoint(self._command_history)
 
-        # save status
-        self._command_history.append(text_status_new)
+    def _execute_measured(self, command_text: str):
+        command_type = MimApp._command_type(self._cur_command)
+        started = self._metrics.start()
+        handler, arguments = self._cur_step
+        text_status_new = handler(self._cur_text_status, *arguments)
+        self._metrics.record(Metrics.PHASE_EXECUTE, command_type, started)
+
+        if self._cur_command.pushes_history(command_text):
+            started = self._metrics.start()
+            self._command_history.append(text_status_new)
+            self._metrics.record(Metrics.PHASE_HISTORY_PUSH, command_type, started)
         self._cur_text_status = text_status_new
 
-    def _find_command(self, command_text: str) -> Command:
-        for c in self._available_commands:
-            if c.validate(command_text):
-                return c
-        return None
+    @staticmethod
+    def _command_type(command: Command) -> str:
+        return type(command).__name__ if command else 'unrecognized'
+
+    def _find_command(self, command_text: str) -> Optional[Tuple[Command, CompiledStep]]:
+        # the command and its arguments come out of one match, execute does not parse again
+        return self._dispatcher.compile(command_text)
@@ -0,0 +1,132 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Iterable, List, Tuple
+
+from commands import AppCommand, SessionClosed
+from main import config_app
+from mim_app import MimApp
+from ui import MimUI, format_spans
+
+
+class SocketMimUI(MimUI):
+
+    """
+    MimUI of one server session. Input lines are read by the session and
+    handed over through pending_input; output uses the same "start_pos
+    end_pos" lines as StreamMimUI, and messages are prefixed with '#'.
+    The app runs in a worker thread, so output is collected and written to
+    the session stream by the event loop, see take_output.
+    """
+
+    def __init__(self) -> None:
+        self.pending_input: str = None
+        self._output: List[str] = []
+
+    def get_input_text(self):
+        return self.pending_input
+
+    def get_input_command(self):
+        return self.pending_input
+
+    def output_text(self, output_text, start_pos: int = 0, end_pos: int = 0,
+                    spans: Iterable[Tuple[int, int]] = None):
+        self._output.append(format_spans(start_pos, end_pos, spans))
+
+    def output_message(self, message: str):
+        self._output.append(f'# {message}\n')
+
+    def take_output(self) -> bytes:
+        """
+        the output collected since the last call, encoded
+        """
+        output = ''.join(self._output).encode('utf-8')
+        self._output.clear()
+        return output
+
+
+class MimServer:
+    """
+    Host many concurrent editing sessions in one process. Every connection
+    gets its own MimApp; the first line it sends is the input text, the
+    following lines are commands. 'bye' closes that session only.
+    Loading the text and running commands, which may scan the whole text,
+    happen in executor threads, so that a large session does not stall the
+    others.
+    """
+
+    MESSAGE_BYE = 'bye'
+    # longest accepted line, i.e. input text, in bytes
+    LINE_LIMIT: int = 16 * 1024 * 1024
+
+    def __init__(self, line_limit: int = LINE_LIMIT, executor: Executor = None) -> None:
+        self._line_limit = line_limit
+        # None for the default executor of the event loop
+        self._executor = executor
+        self._sessions = 0
+
+    @property
+    def sessions(self) -> int:
+        """
+        number of open sessions
+        """
+        return self._sessions
+
+    async def start(self, host: str = None, port: int = None, path: str = None) -> asyncio.AbstractServer:
+        """
+        listen on a Unix socket if path is given, on TCP host:port otherwise
+        """
+        if path:
+            return await asyncio.start_unix_server(self.handle_session, path=path, limit=self._line_limit)
+        return await asyncio.start_server(self.handle_session, host, port, limit=self._line_limit)
+
+    async def handle_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._sessions += 1
+        loop = asyncio.get_running_loop()
+        ui = SocketMimUI()
+        mim_app = config_app(ui, exit_handler=AppCommand.close_session)
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            ui.pending_input = MimServer._decode(line)
+            await loop.run_in_executor(self._executor, mim_app.input_text)
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                ui.pending_input = MimServer._decode(line)
+                await loop.run_in_executor(self._executor, MimServer._run_command, mim_app)
+                writer.write(ui.take_output())
+                await writer.drain()
+        except SessionClosed:
+            ui.output_message(MimServer.MESSAGE_BYE)
+            writer.write(ui.take_output())
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            # peer went away or sent a line over the limit, drop the session
+            pass
+        finally:
+            self._sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    def _run_command(mim_app: MimApp):
+        if mim_app.get_command(mim_app.input_command()):
+            mim_app.execute()
+            mim_app.output_current_text_status()
+        else:
+            mim_app.output_text(MimUI.ERROR_COMMAND_NOT_RECOGNIZABLE)
+
+    @staticmethod
+    def _decode(line: bytes) -> str:
+        return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+
+async def serve(host: str = None, port: int = None, path: str = None):
+    server = await MimServer().start(host, port, path)
+    async with server:
+        await server.serve_forever()
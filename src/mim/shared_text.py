@@ -0,0 +1,78 @@
+import itertools
+import weakref
+from typing import Union
+
+from buffer import TextBuffer
+from text_index import TextIndex
+
+
+class SharedText:
+    """
+    Interned, versioned reference to one immutable text (str or TextBuffer).
+    Every text status over the same text object shares one SharedText, so
+    history entries never copy the text, and anything derived from it (the
+    TextIndex, caches keyed by generation) is computed once per generation.
+    """
+
+    __slots__ = ('_text', '_generation', '_index', 'suffix_array', '__weakref__')
+
+    _generations = itertools.count(1)
+
+    def __init__(self, text: Union[str, TextBuffer]) -> None:
+        self._text = text
+        self._generation: int = next(SharedText._generations)
+        self._index: TextIndex = None
+        # optional substring index of a static text, a suffix_array.SuffixArray
+        self.suffix_array = None
+
+    @property
+    def text(self) -> Union[str, TextBuffer]:
+        return self._text
+
+    @property
+    def generation(self) -> int:
+        """
+        process-wide unique id of this text version
+        """
+        return self._generation
+
+    @property
+    def index(self) -> TextIndex:
+        if self._index is None:
+            self._index = TextIndex(self._text)
+        return self._index
+
+    def build_index(self) -> TextIndex:
+        """
+        build the index now instead of on the first lookup, e.g. when the text is loaded
+        """
+        return self.index
+
+
+# interned texts by id(text); an entry lives as long as a status references its SharedText
+_interned: 'weakref.WeakValueDictionary[int, SharedText]' = weakref.WeakValueDictionary()
+# most recently used text, weakly: a lookup does not keep a text alive after its last status
+_last_shared: 'weakref.ref[SharedText]' = None
+
+
+def intern_text(text: Union[str, TextBuffer]) -> SharedText:
+    """
+    return the SharedText of text, a new generation only for a text object not seen before
+    """
+    global _last_shared
+    shared = _last_shared() if _last_shared is not None else None
+    if shared is not None and shared.text is text:
+        return shared
+    shared = _interned.get(id(text))
+    if shared is None or shared.text is not text:
+        shared = SharedText(text)
+        _interned[id(text)] = shared
+    _last_shared = weakref.ref(shared)
+    return shared
+
+
+def get_text_index(text: Union[str, TextBuffer]) -> TextIndex:
+    """
+    return the index of text, built once per text generation
+    """
+    return intern_text(text).index
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import tempfile
+from typing import Any, Union
+
+from buffer import TextBuffer, code_points, iter_chunks
+from util import LRUCache
+
+
+class SuffixArray:
+    """
+    Sorted suffix offsets of one static text, for literal substring search:
+    the suffixes starting with a literal are one range of the array, found
+    by binary search. The sorted occurrences of recently searched literals
+    are kept, so that a repeated "next occurrence at or after p" is a
+    bisect. Built with NumPy prefix doubling, see build.
+    """
+
+    # literals whose sorted occurrences are kept
+    OCCURRENCES_CACHE_SIZE: int = 64
+
+    def __init__(self, text: Union[str, TextBuffer], suffixes: Any) -> None:
+        self._text = text
+        # NumPy integer array, possibly memory-mapped from the on-disk cache
+        self._suffixes = suffixes
+        self._occurrences = LRUCache(SuffixArray.OCCURRENCES_CACHE_SIZE)
+
+    def __len__(self) -> int:
+        return len(self._suffixes)
+
+    @property
+    def suffixes(self) -> Any:
+        return self._suffixes
+
+    @classmethod
+    def build(cls, text: Union[str, TextBuffer]) -> 'SuffixArray':
+        return cls(text, SuffixArray._build_suffixes(text))
+
+    def find(self, literal: str, start_pos: int, count: int = 1) -> int:
+        """
+        return the start of the count-th occurrence of literal at or after start_pos,
+        occurrences may overlap; -1 if there are fewer
+        """
+        import numpy as np
+
+        occurrences = self.occurrences(literal)
+        i = int(np.searchsorted(occurrences, max(start_pos, 0), side='left')) + count - 1
+        if i >= len(occurrences):
+            return -1
+        return int(occurrences[i])
+
+    def occurrences(self, literal: str) -> Any:
+        """
+        return the sorted start offsets of every occurrence of literal, a NumPy array
+        """
+        import numpy as np
+
+        occurrences = self._occurrences.get(literal)
+        if occurrences is None:
+            low, high = self._range(literal)
+            occurrences = np.sort(self._suffixes[low:high])
+            self._occurrences.put(literal, occurrences)
+        return occurrences
+
+    def _range(self, literal: str):
+        """
+        [low, high) of the suffixes starting with literal
+        """
+        text, suffixes, length = self._text, self._suffixes, len(literal)
+        low, high = 0, len(suffixes)
+        while low < high:
+            middle = (low + high) // 2
+            pos = int(suffixes[middle])
+            if text[pos:pos + length] < literal:
+                low = middle + 1
+            else:
+                high = middle
+        first = low
+        high = len(suffixes)
+        while low < high:
+            middle = (low + high) // 2
+            pos = int(suffixes[middle])
+            if text[pos:pos + length] <= literal:
+                low = middle + 1
+            else:
+                high = middle
+        return first, low
+
+    @staticmethod
+    def _build_suffixes(text: Union[str, TextBuffer]) -> Any:
+        """
+        prefix doubling: sort the suffixes by their first 2**k characters, k = 0, 1, ...,
+        until all ranks are distinct; O(n log^2 n) in NumPy. The ranks are int32 below
+        2**31 characters, the buffers are allocated once and reused by every round.
+        """
+        import numpy as np
+
+        length = len(text)
+        index_type = np.int32 if length < 1 << 31 else np.int64
+        if length == 0:
+            return np.zeros(0, dtype=index_type)
+
+        codes = code_points(text)
+        # dense ranks of the characters, through a table over the code points rather than a sort
+        present = np.zeros(0x110000, dtype=np.bool_)
+        present[codes] = True
+        table = np.cumsum(present, dtype=index_type) - 1
+        rank = table[codes]
+        del codes, present, table
+
+        # the keys need 64 bits, rank * (length + 1) + rank
+        key = np.empty(length, dtype=np.int64)
+        sorted_key = np.empty(length, dtype=np.int64)
+        sorted_rank = np.empty(length, dtype=index_type)
+        k = 1
+        while True:
+            # key of suffix i: (rank of its first k characters, rank of the k after them or -1)
+            np.multiply(rank, length + 1, out=key, dtype=np.int64)
+            tail = key[:length - k]
+            np.add(tail, rank[k:], out=tail)
+            tail += 1
+            suffixes = np.argsort(key, kind='stable')
+            np.take(key, suffixes, out=sorted_key)
+            sorted_rank[0] = 0
+            np.cumsum(sorted_key[1:] != sorted_key[:-1], out=sorted_rank[1:])
+            rank[suffixes] = sorted_rank
+            # distinct once 2k >= length at the latest, suffixes differ in length
+            if sorted_rank[-1] == length - 1:
+                return suffixes.astype(index_type, copy=False)
+            del suffixes
+            k *= 2
+
+
+class SuffixArrayCache:
+    """
+    Suffix arrays on disk, keyed by a hash of the text content, so that a
+    text loaded again (e.g. the same file in a later session) is not
+    sorted again. Cached arrays are memory-mapped, not read.
+    """
+
+    def __init__(self, directory: str = None) -> None:
+        self._directory = directory or SuffixArrayCache.default_directory()
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @staticmethod
+    def default_directory() -> str:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, 'mim', 'suffix-arrays')
+
+    def path(self, text: Union[str, TextBuffer]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for _, chunk in iter_chunks(text):
+            digest.update(chunk.encode('utf-8', errors='surrogatepass'))
+        return os.path.join(self._directory, digest.hexdigest() + '.npy')
+
+    def get(self, text: Union[str, TextBuffer]) -> SuffixArray:
+        """
+        the suffix array of text, from the cache if there, built and cached otherwise
+        """
+        import numpy as np
+
+        path = self.path(text)
+        if os.path.exists(path):
+            return SuffixArray(text, np.load(path, mmap_mode='r'))
+
+        suffix_array = SuffixArray.build(text)
+        os.makedirs(self._directory, exist_ok=True)
+        # write under a temporary name first, a concurrent reader never sees a partial file
+        fd, temp_path = tempfile.mkstemp(suffix='.npy', dir=self._directory)
+        try:
+            with os.fdopen(fd, 'wb') as cache_file:
+                np.save(cache_file, suffix_array.suffixes)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return suffix_array
+
@@ -0,0 +1,273 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, FrozenSet, Pattern, Tuple, Union
+
+from buffer import TextBuffer, iter_chunks
+
+
+class TextIndex:
+    """
+    Precomputed lookup tables over one text, shared by every text status
+    that carries the same text. Text buffers (e.g. memory-mapped files),
+    whose tables would take several times their size in memory, and texts
+    longer than MAX_INDEXED_LENGTH are not indexed but scanned forward
+    chunk by chunk from the search position.
+
+    Line starts are kept in a sorted offset array for every text, extended
+    incrementally: only as far as the positions and lines asked for, so
+    mapping an offset to its (line, column) and back is a bisect. A final
+    newline ends the last line, no empty line follows it. The offsets of
+    a character and the word ends are tabled on their first lookup, so
+    loading a text builds nothing.
+    """
+
+    MAX_INDEXED_LENGTH: int = 1 << 26
+    # characters searched at a time in a TextBuffer, see find_pattern
+    SEARCH_CHUNK_SIZE: int = 1 << 20
+    # context around a search window: longer matches across a window end may be missed
+    SEARCH_OVERLAP: int = 1 << 12
+
+    # words are separated by any unicode whitespace (space, tab, newline, ...)
+    _word_re = re.compile(r'\S+')
+
+    def __init__(self, text: Union[str, TextBuffer]) -> None:
+        self._text = text
+        self._indexed = isinstance(text, str) and len(text) <= TextIndex.MAX_INDEXED_LENGTH
+        # offsets per lowercased character, each built on its first lookup, see _positions_of
+        self._char_positions: Dict[str, array] = {}
+        # distinct characters of the text, found on the first character lookup
+        self._chars: FrozenSet[str] = None
+        self._word_ends: array = None
+        # offset of every line start found so far, newlines before _lines_scanned are all known
+        self._line_starts = array('q', [0])
+        self._lines_scanned = 0
+
+    @property
+    def text(self) -> Union[str, TextBuffer]:
+        return self._text
+
+    def find_char(self, search_char: str, start_pos: int, count: int = 1) -> int:
+        """
+        return the count-th offset >= start_pos holding search_char (case-insensitive),
+        -1 if there are fewer
+        """
+        if not self._indexed:
+            return self._scan_char(search_char, start_pos, count)
+        positions = self._positions_of(search_char)
+        i = bisect_left(positions, start_pos) + count - 1
+        if i >= len(positions):
+            return -1
+        return positions[i]
+
+    def char_positions(self, search_char: str) -> array:
+        """
+        return every offset holding search_char (case-insensitive), ascending
+        """
+        if self._indexed:
+            return self._positions_of(search_char)
+        return array('q', self._iter_char(search_char, 0))
+
+    def find_word_end(self, start_pos: int, count: int = 1) -> int:
+        """
+        return the count-th word end offset (exclusive) > start_pos, or the last one
+        if there are fewer; -1 if there is none
+        """
+        if not self._indexed:
+            end_pos = self._scan_word_end(start_pos)
+            for _ in range(count - 1 if end_pos >= 0 else 0):
+                next_end_pos = self._scan_word_end(end_pos)
+                if next_end_pos < 0:
+                    break
+                end_pos = next_end_pos
+            return end_pos
+        if self._word_ends is None:
+            self._word_ends = TextIndex._build_word_ends(self._text)
+        i = bisect_right(self._word_ends, start_pos)
+        if i == len(self._word_ends):
+            return -1
+        return self._word_ends[min(i + count - 1, len(self._word_ends) - 1)]
+
+    def find_pattern(self, pattern: Pattern, start_pos: int, count: int = 1) -> int:
+        """
+        return the start of the count-th match of pattern starting at or after start_pos,
+        -1 if there are fewer; each match is searched from one past the previous one
+        """
+        pos = max(start_pos, 0)
+        for _ in range(count):
+            pos = self._search(pattern, pos)
+            if pos < 0:
+                return -1
+            pos += 1
+        return pos - 1
+
+    def pattern_positions(self, pattern: Pattern, start_pos: int) -> array:
+        """
+        return every offset >= start_pos that find_pattern can return, ascending:
+        the starts of the matches searched one past the other
+        """
+        positions = array('q')
+        pos = self._search(pattern, max(start_pos, 0))
+        while pos >= 0:
+            positions.append(pos)
+            pos = self._search(pattern, pos + 1)
+        return positions
+
+    def _search(self, pattern: Pattern, start_pos: int) -> int:
+        text = self._text
+        if isinstance(text, str):
+            match = pattern.search(text, start_pos)
+            return match.start() if match else -1
+
+        # windows of a buffer, with SEARCH_OVERLAP characters of context on both sides, so that
+        # anchors and lookarounds see the neighbouring text; a match is taken from the window
+        # it starts in
+        text_length = len(text)
+        chunk_size, overlap = TextIndex.SEARCH_CHUNK_SIZE, TextIndex.SEARCH_OVERLAP
+        pos = start_pos
+        while pos <= text_length:
+            context_start = max(pos - overlap, 0)
+            window_end = min(pos + chunk_size, text_length)
+            window = text[context_start:min(window_end + overlap, text_length)]
+            match = pattern.search(window, pos - context_start)
+            if match is not None and context_start + match.start() <= window_end:
+                return context_start + match.start()
+            if window_end == text_length:
+                return -1
+            pos = window_end + 1
+        return -1
+
+    def line_of(self, pos: int) -> int:
+        """
+        return the line holding offset pos, 0-based
+        """
+        self._scan_lines(pos=pos)
+        return self._clamp_line(bisect_right(self._line_starts, pos) - 1)
+
+    def line_start(self, line: int) -> int:
+        """
+        return the offset of the start of line, or of the last line if there are fewer
+        """
+        self._scan_lines(line=line)
+        return self._line_starts[self._clamp_line(line)]
+
+    def line_end(self, line: int) -> int:
+        """
+        return the offset of the newline ending line (or of the text end for the last line),
+        for the last line if there are fewer
+        """
+        self._scan_lines(line=line)
+        line = self._clamp_line(line)
+        if line + 1 < len(self._line_starts):
+            return self._line_starts[line + 1] - 1
+        return len(self._text)
+
+    def line_count(self) -> int:
+        self._scan_lines()
+        return self._clamp_line(len(self._line_starts)) + 1
+
+    def line_column(self, pos: int) -> Tuple[int, int]:
+        line = self.line_of(pos)
+        return line, pos - self._line_starts[line]
+
+    def offset(self, line: int, column: int) -> int:
+        """
+        return the offset of column in line, clamped to the line (and line to the text)
+        """
+        line_start = self.line_start(line)
+        return line_start + max(min(column, self.line_end(line) - line_start), 0)
+
+    def _clamp_line(self, line: int) -> int:
+        """
+        line within the lines scanned so far, the start after a final newline is not a line
+        """
+        line = min(max(line, 0), len(self._line_starts) - 1)
+        if line > 0 and self._line_starts[line] == len(self._text):
+            line -= 1
+        return line
+
+    def _scan_lines(self, pos: int = None, line: int = None):
+        """
+        extend the line starts chunk by chunk, until the text is scanned past pos,
+        the start of the line after line is known, or the text ends
+        """
+        text_length = len(self._text)
+        while self._lines_scanned < text_length:
+            if pos is not None and self._lines_scanned > pos:
+                return
+            if line is not None and len(self._line_starts) > line + 1:
+                return
+            offset, chunk = next(iter_chunks(self._text, self._lines_scanned))
+            if not chunk:
+                return
+            i = chunk.find('\n')
+            while i >= 0:
+                self._line_starts.append(offset + i + 1)
+                i = chunk.find('\n', i + 1)
+            self._lines_scanned = offset + len(chunk)
+
+    def _scan_char(self, search_char: str, start_pos: int, count: int) -> int:
+        for pos in self._iter_char(search_char, start_pos):
+            count -= 1
+            if count == 0:
+                return pos
+        return -1
+
+    def _iter_char(self, search_char: str, start_pos: int):
+        key = search_char.lower()
+        char_re = re.compile(re.escape(search_char), re.IGNORECASE)
+        for offset, chunk in iter_chunks(self._text, max(start_pos, 0)):
+            for match in char_re.finditer(chunk):
+                if match.group().lower() == key:
+                    yield offset + match.start()
+
+    def _scan_word_end(self, start_pos: int) -> int:
+        pending_end = -1
+        for offset, chunk in iter_chunks(self._text, max(start_pos, 0)):
+            if not chunk:
+                continue
+            if pending_end >= 0 and chunk[0].isspace():
+                return pending_end
+            match = TextIndex._word_re.search(chunk)
+            if match is None:
+                continue
+            if match.end() < len(chunk):
+                return offset + match.end()
+            # the word may continue in the next chunk
+            pending_end = offset + match.end()
+        return pending_end
+
+    def _positions_of(self, search_char: str) -> array:
+        key = search_char.lower()
+        positions = self._char_positions.get(key)
+        if positions is None:
+            if self._chars is None:
+                self._chars = frozenset(self._text)
+            # every character of the text that lowercases to the key, e.g. 'k', 'K' and the Kelvin sign
+            matching = [char for char in self._chars if char.lower() == key]
+            positions = array('q')
+            if matching:
+                positions.extend(match.start()
+                                 for match in re.finditer('|'.join(map(re.escape, matching)), self._text))
+            self._char_positions[key] = positions
+        return positions
+
+    @staticmethod
+    def _build_word_ends(text: Union[str, TextBuffer]) -> array:
+        word_ends = array('q')
+        # a word reaching the end of a chunk may continue in the next one
+        pending_end = -1
+        for offset, chunk in iter_chunks(text):
+            if not chunk:
+                continue
+            if pending_end >= 0 and chunk[0].isspace():
+                word_ends.append(pending_end)
+            pending_end = -1
+            for match in TextIndex._word_re.finditer(chunk):
+                if match.end() == len(chunk):
+                    pending_end = offset + match.end()
+                else:
+                    word_ends.append(offset + match.end())
+        if pending_end >= 0:
+            word_ends.append(pending_end)
+        return word_ends
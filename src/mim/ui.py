@@ -1,8 +1,5 @@
 from abc import abstractmethod
-
-from PyInquirer import prompt
-from examples import custom_style_2
-from prompt_toolkit.validation import Validator, ValidationError
+from typing import Iterable, TextIO, Tuple
 
 
 class MimUI:
@@ -18,9 +15,17 @@ class MimUI:
         pass
 
     @abstractmethod
-    def output_text(self, output_text, start_pos: int = 0, end_pos: int = 0):
+    def output_text(self, output_text, start_pos: int = 0, end_pos: int = 0,
+                    spans: Iterable[Tuple[int, int]] = None):
+        """
+        spans, sorted by start, are all the selections of a multi-cursor status,
+        start_pos and end_pos being the first one
+        """
         pass
 
+    def output_message(self, message: str):
+        self.output_text(message)
+
 
 class SimpleMimUI(MimUI):
 
@@ -28,24 +33,27 @@ class SimpleMimUI(MimUI):
     A simple implementatin of MimUI
     """
 
-    class InputTextValidator(Validator):
+    class InputTextValidator:
+        """
+        PyInquirer input validator, returns True or the error message
+        """
         INPUT_MAX_LENGTH: int = 30
         INPUT_MIN_LENGTH: int = 1
 
-        def validate(self, document):
-            try:
-                if len(document.text) > self.INPUT_MAX_LENGTH or len(document.text) < self.INPUT_MIN_LENGTH:
-                    raise ValueError()
-            except ValueError:
-                raise ValidationError(message="Input should not be empty and cannot exceed 30 characters",
-                                      cursor_position=len(document.text))
+        def __init__(self, input_max_length: int = INPUT_MAX_LENGTH) -> None:
+            self.INPUT_MAX_LENGTH = input_max_length
+
+        def __call__(self, text: str):
+            if len(text) > self.INPUT_MAX_LENGTH or len(text) < self.INPUT_MIN_LENGTH:
+                return f"Input should not be empty and cannot exceed {self.INPUT_MAX_LENGTH} characters"
+            return True
 
     input_question = [
         {
             'type': "input",
             "name": "input_text",
             "message": "Input Text: ",
-            "validate": InputTextValidator,
+            "validate": InputTextValidator(),
         },
     ]
 
@@ -57,25 +65,136 @@ class SimpleMimUI(MimUI):
         },
     ]
 
+    # characters shown around the selection, and the marker of the elided text
+    VIEWPORT: int = 80
+    ELISION_MARKER: str = '...'
+
+    def __init__(self, input_max_length: int = InputTextValidator.INPUT_MAX_LENGTH,
+                 viewport: int = VIEWPORT) -> None:
+        if input_max_length != SimpleMimUI.InputTextValidator.INPUT_MAX_LENGTH:
+            self.input_question = [dict(self.input_question[0],
+                                        validate=SimpleMimUI.InputTextValidator(input_max_length))]
+        self._viewport = viewport
+
     def get_input_text(self):
         # collect the input text
-        answers = prompt(self.input_question, style=custom_style_2)
+        answers = SimpleMimUI._prompt(self.input_question)
         return answers.get("input_text")
 
     def get_input_command(self):
         # collect the input command
-        answers = prompt(self.command_question, style=custom_style_2)
+        answers = SimpleMimUI._prompt(self.command_question)
         return answers.get("input_command")
 
-    def output_text(self, output_text, start_pos: int = 0, end_pos: int = 0) -> str:
+    @staticmethod
+    def _prompt(questions) -> dict:
+        # PyInquirer and prompt_toolkit are slow to import,
+        # load them with the first prompt instead of with this module
+        from PyInquirer import prompt
+        from examples import custom_style_2
+        return prompt(questions, style=custom_style_2)
+
+    def output_text(self, output_text, start_pos: int = 0, end_pos: int = 0,
+                    spans: Iterable[Tuple[int, int]] = None) -> str:
         """
-        Print out formatted content from start_pos(inclusive) to end_pos(exclusive)
+        Print out formatted content from start_pos(inclusive) to end_pos(exclusive),
+        or every span of a multi-cursor status.
+        Only the viewport around the selections is rendered, longer text is elided.
         """
-        if start_pos == end_pos:
-            print(f'Output:         %s' % output_text)
-            return output_text
-
-        # format output
-        formatted_text = output_text[0:start_pos] + "[" + output_text[start_pos:end_pos] + "]" + output_text[end_pos:]
+        if spans is None:
+            spans = ((start_pos, end_pos),)
+        formatted_text = ''.join(self._render(output_text, spans))
         print(f'Output:         %s' % formatted_text)
         return formatted_text
+
+    def output_message(self, message: str):
+        print(f'Output:         %s' % message)
+
+    def _render(self, output_text, spans: Iterable[Tuple[int, int]]):
+        """
+        yield the parts of the formatted viewports, in one pass over the sorted spans,
+        slicing only what is shown; a span overlapping the previous one is shown from its end
+        """
+        viewport = self._viewport
+        rendered_pos = 0
+        after_span = False
+        for start_pos, end_pos in spans:
+            start_pos = max(start_pos, rendered_pos)
+            end_pos = max(end_pos, start_pos)
+            yield from self._render_gap(output_text, rendered_pos, start_pos, after_span, True)
+
+            if start_pos != end_pos:
+                yield "["
+                if end_pos - start_pos <= 2 * viewport:
+                    yield output_text[start_pos:end_pos]
+                else:
+                    yield output_text[start_pos:start_pos + viewport]
+                    yield self.ELISION_MARKER
+                    yield output_text[end_pos - viewport:end_pos]
+                yield "]"
+            rendered_pos = end_pos
+            after_span = True
+
+        yield from self._render_gap(output_text, rendered_pos, len(output_text), after_span, False)
+
+    def _render_gap(self, output_text, start_pos: int, end_pos: int, after_span: bool, before_span: bool):
+        """
+        yield the text between two spans: the viewport next to each of them, elided in between
+        """
+        head_pos = start_pos + self._viewport if after_span else start_pos
+        tail_pos = end_pos - self._viewport if before_span else end_pos
+        if head_pos >= tail_pos:
+            yield output_text[start_pos:end_pos]
+        else:
+            yield output_text[start_pos:head_pos]
+            yield self.ELISION_MARKER
+            yield output_text[tail_pos:end_pos]
+
+
+class StreamMimUI(MimUI):
+
+    """
+    A headless implementation of MimUI for scripted sessions.
+    The text is the first line of the input stream unless given, every
+    following line is a command. Selection spans are written as
+    "start_pos end_pos" lines, all the spans of a multi-cursor status on
+    one line; messages go to the error stream.
+    """
+
+    def __init__(self, input_stream: TextIO, output_stream: TextIO, error_stream: TextIO = None,
+                 input_text: str = None) -> None:
+        self._input_stream = input_stream
+        self._output_stream = output_stream
+        self._error_stream = error_stream
+        self._input_text = input_text
+
+    def get_input_text(self):
+        if self._input_text is None:
+            return self._input_stream.readline().rstrip('\n')
+        return self._input_text
+
+    def get_input_command(self):
+        """
+        return None once the input stream is exhausted
+        """
+        line = self._input_stream.readline()
+        if not line:
+            return None
+        return line.rstrip('\n')
+
+    def output_text(self, output_text, start_pos: int = 0, end_pos: int = 0,
+                    spans: Iterable[Tuple[int, int]] = None):
+        self._output_stream.write(format_spans(start_pos, end_pos, spans))
+
+    def output_message(self, message: str):
+        if self._error_stream is not None:
+            self._error_stream.write(message + '\n')
+
+
+def format_spans(start_pos: int, end_pos: int, spans: Iterable[Tuple[int, int]] = None) -> str:
+    """
+    "start_pos end_pos" line of a selection, "start_pos end_pos start_pos end_pos ..." of many
+    """
+    if spans is None:
+        return f'{start_pos} {end_pos}\n'
+    return ' '.join(f'{start} {end}' for start, end in spans) + '\n'
@@ -1,40 +1,211 @@
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Union
+
+from buffer import TextBuffer
+from shared_text import SharedText, intern_text
+
+
+class Cursors(NamedTuple):
+    """
+    Selections of a multi-cursor status, as parallel NumPy int64 arrays
+    sorted by (start, end) without duplicates; the first one is the
+    primary selection.
+    """
+    starts: Any
+    ends: Any
+
+    @classmethod
+    def of(cls, starts, ends) -> 'Cursors':
+        """
+        cursors of the given selections, sorted and with duplicates removed
+        """
+        import numpy as np
+
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        order = np.lexsort((ends, starts))
+        starts, ends = starts[order], ends[order]
+        distinct = np.ones(len(starts), dtype=bool)
+        distinct[1:] = (starts[1:] != starts[:-1]) | (ends[1:] != ends[:-1])
+        return cls(starts[distinct], ends[distinct])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.nbytes + self.ends.nbytes
+
+    def spans(self) -> List[tuple]:
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
 
 class TextStatus:
+    """
+    Cursor/selection over a text. The text is held as an interned SharedText,
+    so statuses over the same text share one object; assigning a different
+    text object interns that one instead (copy-on-write of the reference).
+    A multi-cursor status also carries all its selections in cursors, the
+    start and end positions being those of the first one.
+    """
 
-    def __init__(self, current_text: str, current_command: str, start_pos: int = -1, end_pos: int = -1) -> None:
-        self._current_text = current_text
-        self._current_command = current_command
-        self._start_pos = start_pos
-        self._end_pos = end_pos
+    __slots__ = ('_shared_text', 'current_command', 'start_position', 'end_position', 'cursors')
+
+    def __init__(self, current_text: Union[str, TextBuffer], current_command: str,
+                 start_pos: int = -1, end_pos: int = -1) -> None:
+        self._shared_text: SharedText = intern_text(current_text)
+        self.current_command: str = current_command
+        self.start_position: int = start_pos
+        self.end_position: int = end_pos
+        self.cursors: Cursors = None
+
+    @classmethod
+    def from_shared(cls, shared_text: SharedText, current_command: str,
+                    start_pos: int = -1, end_pos: int = -1, cursors: Cursors = None) -> 'TextStatus':
+        """
+        status over an already interned text, without looking it up again
+        """
+        text_status = cls.__new__(cls)
+        text_status._shared_text = shared_text
+        text_status.current_command = current_command
+        text_status.start_position = start_pos
+        text_status.end_position = end_pos
+        text_status.cursors = cursors
+        return text_status
+
+    @classmethod
+    def from_cursors(cls, shared_text: SharedText, current_command: str, cursors: Cursors) -> 'TextStatus':
+        """
+        multi-cursor status, a single cursor makes an ordinary status
+        """
+        start_pos, end_pos = int(cursors.starts[0]), int(cursors.ends[0])
+        return cls.from_shared(shared_text, current_command, start_pos, end_pos,
+                               cursors if len(cursors) > 1 else None)
 
     @property
-    def current_text(self) -> str:
-        return self._current_text
+    def current_text(self) -> Union[str, TextBuffer]:
+        return self._shared_text.text
 
     @current_text.setter
-    def current_text(self, current_ext):
-        self._current_text = current_ext
+    def current_text(self, current_text: Union[str, TextBuffer]):
+        if current_text is not self._shared_text.text:
+            self._shared_text = intern_text(current_text)
 
     @property
-    def current_command(self) -> str:
-        return self._current_command
+    def shared_text(self) -> SharedText:
+        return self._shared_text
 
-    @current_command.setter
-    def current_command(self, current_command: str):
-        self._current_command = current_command
+    @property
+    def generation(self) -> int:
+        return self._shared_text.generation
+
+
+class TextStatusArray:
+    """
+    Compact container of many text statuses over one shared text,
+    stored as parallel integer arrays (start, end, command id)
+    """
+
+    def __init__(self, current_text: str) -> None:
+        self._shared_text = intern_text(current_text)
+        self._starts = array('q')
+        self._ends = array('q')
+        self._command_ids = array('l')
+        self._commands: List[str] = []
+        self._command_table: Dict[str, int] = {}
 
     @property
-    def start_position(self):
-        return self._start_pos
+    def current_text(self) -> str:
+        return self._shared_text.text
 
-    @start_position.setter
-    def start_position(self, start_position: int):
-        self._start_pos = start_position
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __getitem__(self, index: int) -> TextStatus:
+        return TextStatus.from_shared(self._shared_text,
+                                      self._commands[self._command_ids[index]],
+                                      self._starts[index],
+                                      self._ends[index])
+
+    def append(self, text_status: TextStatus):
+        if text_status.shared_text is not self._shared_text:
+            raise ValueError('text status does not refer to the shared text')
+        self.append_positions(text_status.start_position, text_status.end_position, text_status.current_command)
+
+    def append_positions(self, start_pos: int, end_pos: int, current_command: str):
+        command_id = self._command_table.get(current_command)
+        if command_id is None:
+            command_id = self._command_table[current_command] = len(self._commands)
+            self._commands.append(current_command)
+        self._starts.append(start_pos)
+        self._ends.append(end_pos)
+        self._command_ids.append(command_id)
+
+    def pop(self) -> TextStatus:
+        text_status = self[-1]
+        self._starts.pop()
+        self._ends.pop()
+        self._command_ids.pop()
+        return text_status
+
+    @property
+    def start_positions(self) -> array:
+        return self._starts
+
+    @property
+    def end_positions(self) -> array:
+        return self._ends
+
+
+class LRUCache:
+    """
+    Mapping of at most maxsize entries, evicting the least recently used one;
+    counts lookup hits and misses. A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize < 0:
+            raise ValueError('maxsize must not be negative')
+        self._maxsize = maxsize
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
 
     @property
-    def end_position(self):
-        return self._end_pos
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self._misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if not self._maxsize:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
 
-    @end_position.setter
-    def end_position(self, end_position: int):
-        self._end_pos = end_position
+    def clear(self):
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
@@ -0,0 +1,166 @@
+import os
+import random
+import re
+import tempfile
+import unittest
+
+from mim.buffer import MmapBuffer, PieceTable
+from mim.commands import NavigationCommand, SelectionCommand
+from mim.text_index import TextIndex
+from mim.util import TextStatus
+
+
+class PieceTableTestCase(unittest.TestCase):
+
+    def _random_table(self, rnd: random.Random):
+        text = ''.join(rnd.choice('ab c\tAB') for _ in range(rnd.randrange(1, 40)))
+        table = PieceTable(text)
+        for _ in range(rnd.randrange(8)):
+            if rnd.random() < 0.6:
+                pos = rnd.randrange(len(text) + 1)
+                inserted = ''.join(rnd.choice('ab c\nAB') for _ in range(rnd.randrange(1, 6)))
+                table = table.insert(pos, inserted)
+                text = text[:pos] + inserted + text[pos:]
+            elif text:
+                start = rnd.randrange(len(text))
+                end = rnd.randrange(start, len(text) + 1)
+                table = table.delete(start, end)
+                text = text[:start] + text[end:]
+        return table, text
+
+    def test_same_as_str(self):
+        rnd = random.Random(3)
+        for _ in range(300):
+            table, text = self._random_table(rnd)
+            self.assertEqual(len(table), len(text))
+            self.assertEqual(str(table), text)
+            for pos in range(-len(text), len(text)):
+                self.assertEqual(table[pos], text[pos])
+            start = rnd.randrange(len(text) + 1)
+            stop = rnd.randrange(len(text) + 1)
+            self.assertEqual(table[start:stop], text[start:stop])
+            for sub in ('a', 'b c', 'AB', 'c\na', 'ab c\tAB', 'x'):
+                self.assertEqual(table.find(sub, start), text.find(sub, start), (text, sub, start))
+                self.assertEqual(table.find(sub, 0, stop), text.find(sub, 0, stop), (text, sub, stop))
+
+    def test_find_across_pieces(self):
+        # the source of a piece goes on past its end with deleted text
+        table = PieceTable('abcdef').delete(1, 6).insert(0, 'Z').insert(2, 'Q')
+        self.assertEqual(str(table), 'ZaQ')
+        self.assertEqual(table.find('Zab'), -1)
+
+        # many short pieces over a small alphabet, substrings spanning their boundaries
+        rnd = random.Random(7)
+        for _ in range(300):
+            text = ''.join(rnd.choice('ab') for _ in range(rnd.randrange(1, 30)))
+            table = PieceTable(text)
+            for _ in range(rnd.randrange(1, 12)):
+                if rnd.random() < 0.6:
+                    pos = rnd.randrange(len(text) + 1)
+                    inserted = ''.join(rnd.choice('ab') for _ in range(rnd.randrange(1, 4)))
+                    table = table.insert(pos, inserted)
+                    text = text[:pos] + inserted + text[pos:]
+                elif text:
+                    start = rnd.randrange(len(text))
+                    end = rnd.randrange(start, min(start + 4, len(text)) + 1)
+                    table = table.delete(start, end)
+                    text = text[:start] + text[end:]
+            for _ in range(10):
+                start = rnd.randrange(len(text) + 1)
+                sub_start = rnd.randrange(len(text) + 1)
+                sub = text[sub_start:sub_start + rnd.randrange(1, 8)] or 'ab'
+                if rnd.random() < 0.3:
+                    sub = ''.join(rnd.choice('ab') for _ in range(rnd.randrange(1, 6)))
+                self.assertEqual(table.find(sub, start), text.find(sub, start), (text, sub, start))
+                stop = rnd.randrange(len(text) + 1)
+                self.assertEqual(table.find(sub, 0, stop), text.find(sub, 0, stop), (text, sub, stop))
+
+    def test_commands_on_piece_table(self):
+        rnd = random.Random(5)
+        nav_command = NavigationCommand()
+        sel_command = SelectionCommand(nav_command)
+        for _ in range(100):
+            table, text = self._random_table(rnd)
+            for command_text in ('0', '$', 'e', 'ta', 'tB', 't ', 'j', '2k', 'v$', 've', 'vtb', 'vj'):
+                command = sel_command if command_text.startswith('v') else nav_command
+                start = rnd.randrange(len(text) + 1)
+                end = rnd.randrange(start, len(text) + 1)
+                expected = command.execute(TextStatus(text, command_text, start, end))
+                actual = command.execute(TextStatus(table, command_text, start, end))
+                self.assertIs(actual.current_text, table)
+                self.assertEqual((expected.start_position, expected.end_position),
+                                 (actual.start_position, actual.end_position))
+
+
+class MmapBufferTestCase(unittest.TestCase):
+
+    TEXT = 'Hello Wörld?\t\u3000Héllo 世界!\nbye  '
+
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as text_file:
+            text_file.write(self.TEXT.encode('utf-8'))
+        # tiny blocks, so that most lookups cross block boundaries
+        self.buffer = MmapBuffer(self.path, block_size=5)
+
+    def tearDown(self) -> None:
+        self.buffer.close()
+        os.remove(self.path)
+
+    def test_same_as_str(self):
+        text = self.TEXT
+        self.assertEqual(len(self.buffer), len(text))
+        self.assertEqual(str(self.buffer), text)
+        for pos in range(len(text)):
+            self.assertEqual(self.buffer[pos], text[pos])
+            self.assertEqual(self.buffer[pos:], text[pos:])
+            self.assertEqual(self.buffer[:pos], text[:pos])
+            byte_offset = len(text[:pos].encode('utf-8'))
+            self.assertEqual(self.buffer.byte_offset(pos), byte_offset)
+            self.assertEqual(self.buffer.char_offset(byte_offset), pos)
+            for sub in ('l', 'llo', 'ö', '世界!', '\n', '  ', 'x'):
+                self.assertEqual(self.buffer.find(sub, pos), text.find(sub, pos))
+
+    def test_text_index(self):
+        indexed = TextIndex(self.TEXT)
+        # buffers are never indexed, they are scanned
+        scanned = TextIndex(self.buffer)
+
+        for pos in range(len(self.TEXT) + 1):
+            for count in (1, 2, 3):
+                self.assertEqual(scanned.find_word_end(pos, count), indexed.find_word_end(pos, count), pos)
+                for char in ('l', 'H', 'é', 'É', '界', ' ', '!'):
+                    self.assertEqual(scanned.find_char(char, pos, count), indexed.find_char(char, pos, count),
+                                     (char, pos))
+            self.assertEqual(scanned.line_column(pos), indexed.line_column(pos), pos)
+
+    def test_find_pattern(self):
+        indexed = TextIndex(self.TEXT)
+        chunk_size, overlap = TextIndex.SEARCH_CHUNK_SIZE, TextIndex.SEARCH_OVERLAP
+        # tiny windows, so that most matches cross window ends; no match is longer than the overlap
+        TextIndex.SEARCH_CHUNK_SIZE, TextIndex.SEARCH_OVERLAP = 7, 5
+        try:
+            scanned = TextIndex(self.buffer)
+            patterns = [re.compile(p) for p in ('l+', 'ö', 'Wörld', r'\s+', '^H', r'(?<=\t)\S', '界!$', '[!?]')]
+            for pos in range(len(self.TEXT) + 1):
+                for pattern in patterns:
+                    for count in (1, 2):
+                        self.assertEqual(scanned.find_pattern(pattern, pos, count),
+                                         indexed.find_pattern(pattern, pos, count), (pattern, pos, count))
+        finally:
+            TextIndex.SEARCH_CHUNK_SIZE, TextIndex.SEARCH_OVERLAP = chunk_size, overlap
+
+    def test_empty_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with MmapBuffer(path) as buffer:
+                self.assertEqual(len(buffer), 0)
+                self.assertEqual(str(buffer), '')
+                self.assertEqual(buffer.find('a'), -1)
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
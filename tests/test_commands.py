@@ -1,7 +1,14 @@
+import random
 import unittest
 
-from mim.commands import NavigationCommand, SelectionCommand
-from mim.util import TextStatus
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mim.commands import MacroCommand, MultiCursorCommand, NavigationCommand, SelectionCommand
+from mim.macro import MacroRegisters
+from mim.util import Cursors, TextStatus
 
 
 class MimCommandTestCase(unittest.TestCase):
@@ -216,6 +223,59 @@ class NavigationTestCase(MimCommandTestCase):
         text_status.end_position = 26
         self._assertions(text_status, start_pos_expected=25, end_pos_expected=26)
 
+        #####################################
+        # Tabs, newlines and unicode spaces
+        #####################################
+        input_text = 'Hello\tWorld?\n\u3000Hello World!'
+        text_status.current_text = input_text
+
+        # TEST 'Hell[o]\tWorld?\n\u3000Hello World!'
+        # EXPECTED: 'Hello\tWorld[?]\n\u3000Hello World!'
+        text_status.start_position = 4
+        text_status.end_position = 5
+        self._assertions(text_status, start_pos_expected=11, end_pos_expected=12)
+
+        # TEST 'Hello\tWorld[?]\n\u3000Hello World!'
+        # EXPECTED: 'Hello\tWorld?\n\u3000Hell[o] World!'
+        text_status.start_position = 11
+        text_status.end_position = 12
+        self._assertions(text_status, start_pos_expected=18, end_pos_expected=19)
+
+    def test_count(self):
+        # 01234567890123456789012345
+        # Hello World?  Hello World!
+        input_text = 'Hello World?  Hello World!'
+
+        # same as repeating the motion
+        for start_pos in range(len(input_text)):
+            for count in range(1, 6):
+                expected = TextStatus(input_text, 'e', start_pos, start_pos + 1)
+                for _ in range(count):
+                    expected = self.command.execute(expected)
+                text_status = TextStatus(input_text, f'{count}e', start_pos, start_pos + 1)
+                self._assertions(text_status, expected.start_position, expected.end_position)
+
+        # TEST '[H]ello World?  Hello World!'
+        # EXPECTED: 'Hello World?  Hell[o] World!'
+        text_status = TextStatus(input_text, '2to', 0, 1)
+        self._assertions(text_status, start_pos_expected=6, end_pos_expected=7)
+
+        # TEST '[H]ello World?  Hello World!'
+        # EXPECTED: 'Hello World?  Hello Wo[r]ld!'
+        text_status = TextStatus(input_text, '4to', 0, 1)
+        self._assertions(text_status, start_pos_expected=20, end_pos_expected=21)
+
+        # fewer matches than the count: no jump
+        # TEST '[H]ello World?  Hello World!'
+        # EXPECTED: '[H]ello World?  Hello World!'
+        text_status = TextStatus(input_text, '5to', 0, 1)
+        self._assertions(text_status, start_pos_expected=0, end_pos_expected=1)
+
+        # TEST 'Hello W[o]rld?  Hello World!'
+        # EXPECTED: 'Hello World?  Hello World[!]'
+        text_status = TextStatus(input_text, '12$', 7, 8)
+        self._assertions(text_status, start_pos_expected=25, end_pos_expected=26)
+
     def test_validation(self):
         # acceptable commands
         self.assertTrue(self.command.validate('0'))
@@ -224,6 +284,20 @@ class NavigationTestCase(MimCommandTestCase):
         self.assertTrue(self.command.validate('tw'))
         self.assertTrue(self.command.validate('tW'))
         self.assertTrue(self.command.validate('t!'))
+        self.assertTrue(self.command.validate('3e'))
+        self.assertTrue(self.command.validate('10e'))
+        self.assertTrue(self.command.validate('2tw'))
+        self.assertTrue(self.command.validate('2t5'))
+        self.assertTrue(self.command.validate('1$'))
+        self.assertTrue(self.command.validate('j'))
+        self.assertTrue(self.command.validate('k'))
+        self.assertTrue(self.command.validate('20j'))
+        self.assertTrue(self.command.validate('/Wor'))
+        self.assertTrue(self.command.validate('/a b+'))
+        self.assertTrue(self.command.validate('3/x'))
+        self.assertTrue(self.command.validate('n'))
+        self.assertFalse(self.command.validate('/'))
+        self.assertFalse(self.command.validate('/[a'))
 
         # unacceptable commands
         self.assertFalse(self.command.validate('tAa'))
@@ -233,6 +307,103 @@ class NavigationTestCase(MimCommandTestCase):
         self.assertFalse(self.command.validate('0e'))
         self.assertFalse(self.command.validate('z'))
         self.assertFalse(self.command.validate('T'))
+        self.assertFalse(self.command.validate('10'))
+        self.assertFalse(self.command.validate('3'))
+        self.assertFalse(self.command.validate('03e'))
+        self.assertFalse(self.command.validate('3v$'))
+
+    def test_cache(self):
+        input_text = 'Hello World?  Hello World!'
+        # one generation while the text is referenced, as by the history of the app
+        shared_text = TextStatus(input_text, None, 0, 0).shared_text
+        for _ in range(3):
+            self._assertions(TextStatus(input_text, 'e', 0, 1), start_pos_expected=4, end_pos_expected=5)
+            self._assertions(TextStatus(input_text, 'tw', 0, 1), start_pos_expected=5, end_pos_expected=6)
+        self.assertEqual((self.command.cache.misses, self.command.cache.hits), (2, 4))
+
+        # same positions over another text do not hit the cached results
+        self._assertions(TextStatus('Hi Mim!', 'e', 0, 1), start_pos_expected=1, end_pos_expected=2)
+        self.assertEqual(self.command.cache.misses, 3)
+
+        # the selection path resolves its motion through the same cache
+        selection = SelectionCommand(self.command)
+        text_status = selection.execute(TextStatus(input_text, 've', 0, 0))
+        text_status = selection.execute(TextStatus(input_text, 've', 0, 0))
+        self.assertEqual((text_status.start_position, text_status.end_position), (0, 5))
+        self.assertEqual(self.command.cache.hits, 6)
+
+    def test_lines(self):
+        # 0123 4 56789
+        # abc\n \nde f
+        input_text = 'abc\n\nde f'
+
+        # '0' and '$' stay on the current line
+        self._assertions(TextStatus(input_text, '0', 8, 9), start_pos_expected=5, end_pos_expected=6)
+        self._assertions(TextStatus(input_text, '$', 1, 2), start_pos_expected=2, end_pos_expected=3)
+        self._assertions(TextStatus(input_text, '$', 4, 5), start_pos_expected=4, end_pos_expected=5)
+        self._assertions(TextStatus(input_text, '3$', 1, 2), start_pos_expected=8, end_pos_expected=9)
+
+        # 'j' and 'k' keep the column, within the target line
+        self._assertions(TextStatus(input_text, 'j', 2, 3), start_pos_expected=4, end_pos_expected=5)
+        self._assertions(TextStatus(input_text, '2j', 2, 3), start_pos_expected=7, end_pos_expected=8)
+        self._assertions(TextStatus(input_text, '5j', 1, 2), start_pos_expected=6, end_pos_expected=7)
+        self._assertions(TextStatus(input_text, 'k', 8, 9), start_pos_expected=4, end_pos_expected=5)
+        self._assertions(TextStatus(input_text, '9k', 8, 9), start_pos_expected=2, end_pos_expected=3)
+
+        # a final newline ends the last line, motions stay within the text
+        # 012 345
+        # ab\ncd\n
+        input_text = 'ab\ncd\n'
+        self._assertions(TextStatus(input_text, '2j', 0, 1), start_pos_expected=3, end_pos_expected=4)
+        self._assertions(TextStatus(input_text, '5j', 1, 2), start_pos_expected=4, end_pos_expected=5)
+        self._assertions(TextStatus(input_text, '9$', 0, 1), start_pos_expected=4, end_pos_expected=5)
+        self._assertions(TextStatus(input_text, '0', 6, 7), start_pos_expected=3, end_pos_expected=4)
+
+    def test_search(self):
+        # 0123456789012345678901234
+        # Hello World?  Hello World!
+        input_text = 'Hello World?  Hello World!'
+
+        self._assertions(TextStatus(input_text, '/Wor', 0, 0), start_pos_expected=6, end_pos_expected=7)
+        self._assertions(TextStatus(input_text, '/Wor', 6, 7), start_pos_expected=20, end_pos_expected=21)
+        self._assertions(TextStatus(input_text, '2/o', 0, 1), start_pos_expected=7, end_pos_expected=8)
+        self._assertions(TextStatus(input_text, '/^H', 1, 2), start_pos_expected=1, end_pos_expected=2)
+        self._assertions(TextStatus(input_text, '/(?<= )H', 0, 1), start_pos_expected=14, end_pos_expected=15)
+        # no match, or an invalid pattern, stay
+        self._assertions(TextStatus(input_text, '/x', 3, 5), start_pos_expected=3, end_pos_expected=5)
+        self._assertions(TextStatus(input_text, '/[', 3, 5), start_pos_expected=3, end_pos_expected=5)
+
+    def test_repeat_search(self):
+        input_text = 'Hello World?  Hello World!'
+        # nothing to repeat yet
+        self._assertions(TextStatus(input_text, 'n', 2, 3), start_pos_expected=2, end_pos_expected=3)
+
+        self._assertions(TextStatus(input_text, '/l+', 0, 1), start_pos_expected=2, end_pos_expected=3)
+        self._assertions(TextStatus(input_text, 'n', 2, 3), start_pos_expected=3, end_pos_expected=4)
+        self._assertions(TextStatus(input_text, '2n', 3, 4), start_pos_expected=16, end_pos_expected=17)
+        # the pattern was compiled once
+        self.assertEqual(self.command._patterns.misses, 1)
+
+        self._assertions(TextStatus(input_text, '/d', 0, 1), start_pos_expected=10, end_pos_expected=11)
+        self._assertions(TextStatus(input_text, 'n', 10, 11), start_pos_expected=24, end_pos_expected=25)
+
+    def test_compile(self):
+        input_text = 'Hello World?  Hello World!'
+        for command_text in ['0', '$', 'e', '3e', 'tw', '2to', 'j', '2k']:
+            handler, arguments = self.command.compile(command_text)
+            for start_pos in range(len(input_text)):
+                text_status = TextStatus(input_text, command_text, start_pos, start_pos + 1)
+                expected = self.command.execute(text_status)
+                actual = handler(TextStatus(input_text, None, start_pos, start_pos + 1), *arguments)
+                self.assertEqual((expected.start_position, expected.end_position, expected.current_command),
+                                 (actual.start_position, actual.end_position, actual.current_command))
+
+    def test_cache_disabled(self):
+        self.command = NavigationCommand(cache_size=0)
+        input_text = 'Hello World?  Hello World!'
+        for _ in range(2):
+            self._assertions(TextStatus(input_text, 'e', 0, 1), start_pos_expected=4, end_pos_expected=5)
+        self.assertEqual(len(self.command.cache), 0)
 
 
 class SelectionTestCase(MimCommandTestCase):
@@ -317,15 +488,42 @@ class SelectionTestCase(MimCommandTestCase):
         text_status.end_position = 7
         self._assertions(text_status, start_pos_expected=1, end_pos_expected=12)
 
+        # TEST 'H[ello W]orld? Hello World!'
+        # EXPECTED: 'H[ello World? Hello] World!'
+        # COMMAND: v2e
+        text_status.current_command = SelectionCommand.COMMAND_SELECTION + '2' + NavigationCommand.COMMAND_MOVE_TO_WORD_END
+        text_status.start_position = 1
+        text_status.end_position = 7
+        self._assertions(text_status, start_pos_expected=1, end_pos_expected=18)
+
+        # TEST 'H[ello W]orld? Hello World!'
+        # EXPECTED: 'H[ello World? Hello W]orld!'
+        # COMMAND: v/Wor
+        text_status.current_command = SelectionCommand.COMMAND_SELECTION + '/Wor'
+        text_status.start_position = 1
+        text_status.end_position = 7
+        self._assertions(text_status, start_pos_expected=1, end_pos_expected=20)
+
+        # TEST 'Hello World? Hello World[!]'
+        # EXPECTED: 'Hello World? Hello World[!]', the selection stays within the text
+        # COMMAND: ve
+        text_status.current_command = command_ve
+        text_status.start_position = 24
+        text_status.end_position = 25
+        self._assertions(text_status, start_pos_expected=24, end_pos_expected=25)
+
     def test_validation(self):
 
         # acceptable commands
         self.assertTrue(self.command.validate('v0'))
+        self.assertTrue(self.command.validate('v/W.r'))
         self.assertTrue(self.command.validate('v$'))
         self.assertTrue(self.command.validate('ve'))
         self.assertTrue(self.command.validate('vtw'))
         self.assertTrue(self.command.validate('vtW'))
         self.assertTrue(self.command.validate('vt!'))
+        self.assertTrue(self.command.validate('v3e'))
+        self.assertTrue(self.command.validate('v2tw'))
 
         # unacceptable commands
         self.assertFalse(self.command.validate('0'))
@@ -343,5 +541,157 @@ class SelectionTestCase(MimCommandTestCase):
         self.assertFalse(self.command.validate('T'))
 
 
+class MacroTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.nav_command = NavigationCommand()
+        self.sel_command = SelectionCommand(self.nav_command)
+        self.command = MacroCommand(MacroRegisters())
+
+    def _record(self, register: str, commands):
+        macros = self.command.macros
+        self.command.execute(TextStatus('', 'q' + register, 0, 0))
+        for command, command_text in commands:
+            macros.record(command, command_text)
+        self.command.execute(TextStatus('', 'q', 0, 0))
+
+    def test_play(self):
+        # 0123456789012345678901234
+        # Hello World? Hello World!
+        input_text = 'Hello World? Hello World!'
+        self._record('a', [(self.nav_command, 'e'), (self.sel_command, 'vto')])
+        self.assertEqual(self.command.macros.get('a').command_texts, ['e', 'vto'])
+
+        text_status = self.command.execute(TextStatus(input_text, '@a', 0, 1))
+        self.assertEqual((text_status.start_position, text_status.end_position), (4, 7))
+        self.assertEqual(text_status.current_command, '@a')
+
+        text_status = self.command.execute(TextStatus(input_text, '2@a', 0, 1))
+        self.assertEqual((text_status.start_position, text_status.end_position), (11, 17))
+
+        # an empty register leaves the status as it is
+        text_status = self.command.execute(TextStatus(input_text, '@b', 3, 4))
+        self.assertEqual((text_status.start_position, text_status.end_position), (3, 4))
+
+    def test_nested(self):
+        input_text = 'Hello World? Hello World!'
+        self._record('a', [(self.nav_command, 'e')])
+        self._record('b', [(self.command, '@a'), (self.command, '2@a')])
+        # re-recording 'a' does not change 'b', it was compiled with the former 'a'
+        self._record('a', [(self.nav_command, '$')])
+
+        text_status = self.command.execute(TextStatus(input_text, '@b', 0, 1))
+        self.assertEqual((text_status.start_position, text_status.end_position), (17, 18))
+
+    def test_validation(self):
+        for command_text in ['q', 'qa', 'qz', '@a', '3@a', '12@b']:
+            self.assertTrue(self.command.validate(command_text), command_text)
+        for command_text in ['@', 'qA', 'q1', '0@a', '@ab', 'qaa']:
+            self.assertFalse(self.command.validate(command_text), command_text)
+
+
+@unittest.skipIf(numpy is None, 'batch navigation requires NumPy')
+class NavigationBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.command = NavigationCommand()
+
+    def test_same_as_execute(self):
+        rnd = random.Random(11)
+        alphabet = 'aAbB  \t\n!?\u3000\u00e9\u00c9\u4e16'
+        texts = [''.join(rnd.choice(alphabet) for _ in range(rnd.randrange(0, 30))) for _ in range(500)]
+        texts += ['Hello World?  Hello World!', 'word', ' ', '', 'ab\ncd\n', '\n', '\n\n']
+
+        for command_text in ('0', '$', 'e', 'ta', 'tA', 't ', 't!', 't\u00e9', 'tz', '3e', '12e', '2ta', '5t ',
+                             '3$', 'j', 'k', '2j', '3k'):
+            start_positions = [rnd.randrange(0, len(text) + 2) for text in texts]
+            end_positions = [rnd.randrange(0, len(text) + 2) for text in texts]
+            new_starts, new_ends = self.command.execute_batch(texts, command_text, start_positions, end_positions)
+
+            self.assertEqual(len(new_starts), len(texts))
+            for text, start, end, new_start, new_end in zip(texts, start_positions, end_positions,
+                                                            new_starts, new_ends):
+                expected = self.command.execute(TextStatus(text, command_text, start, end))
+                self.assertEqual((expected.start_position, expected.end_position), (new_start, new_end),
+                                 (text, command_text, start, end))
+
+    def test_empty_batch(self):
+        new_starts, new_ends = self.command.execute_batch([], 'e', [], [])
+        self.assertEqual(len(new_starts), 0)
+        self.assertEqual(len(new_ends), 0)
+
+    def test_invalid_command(self):
+        self.assertRaises(ValueError, self.command.execute_batch, ['abc'], 'v$', [0], [0])
+
+
+@unittest.skipIf(numpy is None, 'multiple cursors require NumPy')
+class MultiCursorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.command = MultiCursorCommand()
+
+    def test_create(self):
+        # 0123456789012345678901234
+        # Hello World? Hello World!
+        input_text = 'Hello World? Hello World!'
+        text_status = self.command.execute(TextStatus(input_text, '*tO', 0, 0))
+        self.assertEqual(text_status.cursors.spans(), [(3, 4), (6, 7), (16, 17), (19, 20)])
+        self.assertEqual((text_status.start_position, text_status.end_position), (3, 4))
+
+        # a single match is an ordinary status, none or only at offset 0 stays
+        text_status = self.command.execute(TextStatus(input_text, '*t?', 0, 0))
+        self.assertIsNone(text_status.cursors)
+        self.assertEqual((text_status.start_position, text_status.end_position), (10, 11))
+        text_status = self.command.execute(TextStatus(input_text, '*tH', 5, 6))
+        self.assertEqual((text_status.start_position, text_status.end_position), (12, 13))
+        text_status = self.command.execute(TextStatus(input_text, '*tz', 5, 6))
+        self.assertEqual((text_status.start_position, text_status.end_position, text_status.cursors), (5, 6, None))
+
+        # '*' keeps the primary cursor
+        text_status = self.command.execute(TextStatus.from_cursors(text_status.shared_text, '*',
+                                                                   Cursors.of([9, 2], [10, 3])))
+        self.assertEqual((text_status.start_position, text_status.end_position, text_status.cursors), (2, 3, None))
+
+    def test_validation(self):
+        for command_text in ['*', '*ta', '*t ', '*t*']:
+            self.assertTrue(self.command.validate(command_text), command_text)
+        for command_text in ['**', '*t', '*x', '*tab', 't*']:
+            self.assertFalse(self.command.validate(command_text), command_text)
+
+    def test_same_as_each_cursor(self):
+        rnd = random.Random(5)
+        alphabet = 'aAbB  \t\n!?\u00e9\u4e16'
+        nav_command, each_nav_command = NavigationCommand(), NavigationCommand()
+        sel_command, each_sel_command = SelectionCommand(nav_command), SelectionCommand(each_nav_command)
+
+        for _ in range(100):
+            text = ''.join(rnd.choice(alphabet) for _ in range(rnd.randrange(1, 40)))
+            spans = [(start, start + rnd.randrange(0, 3))
+                     for start in (rnd.randrange(0, len(text) + 1) for _ in range(rnd.randrange(2, 6)))]
+            text_status = TextStatus(text, None)
+            cursors = Cursors.of([start for start, _ in spans], [end for _, end in spans])
+            for command_text in ('0', '$', 'e', 'ta', 't ', '3e', '2tb', '2$', 'j', '2k', '/a', 'n', '/b|\n',
+                                 '2n', '/zz', 've', 'vtb', 'v0', 'vk', 'v/a', 'vn'):
+                command, each_command = ((sel_command, each_sel_command) if command_text[0] == 'v'
+                                         else (nav_command, each_nav_command))
+                moved = [each_command.execute(TextStatus.from_shared(text_status.shared_text, command_text,
+                                                                     start, end))
+                         for start, end in cursors.spans()]
+                expected = Cursors.of([status.start_position for status in moved],
+                                      [status.end_position for status in moved])
+
+                text_status = command.execute(TextStatus.from_cursors(text_status.shared_text, command_text,
+                                                                      cursors))
+                self.assertEqual(text_status.current_command, command_text)
+                self.assertEqual((text_status.start_position, text_status.end_position),
+                                 expected.spans()[0], (text, command_text, cursors.spans()))
+                if len(expected) > 1:
+                    self.assertEqual(text_status.cursors.spans(), expected.spans(), (text, command_text))
+                else:
+                    self.assertIsNone(text_status.cursors)
+                    break
+                cursors = text_status.cursors
+
+
 if __name__ == '__main__':
     unittest.main()
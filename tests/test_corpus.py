@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import corpus
+from corpus import CorpusRunner
+
+
+class CorpusRunnerTestCase(unittest.TestCase):
+
+    TEXTS = ['Hello World?  Hello World!', 'Héllo Wörld!', 'x', 'bye bye']
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, 'sub'))
+        self.paths = []
+        for i, text in enumerate(self.TEXTS):
+            path = os.path.join(self.directory, 'sub' if i % 2 else '', f'doc{i}.txt')
+            with open(path, 'w', encoding='utf-8') as text_file:
+                text_file.write(text)
+            self.paths.append(path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_run(self):
+        runner = CorpusRunner(['e', 've', 'x', 'tw'], processes=2)
+        results = list(runner.run(self.directory))
+
+        self.assertEqual([r.path for r in results], CorpusRunner.list_documents(self.directory))
+        by_path = {r.path: r for r in results}
+        self.assertEqual(by_path[self.paths[0]].spans, [(4, 5), (4, 12), (5, 6)])
+        self.assertEqual(by_path[self.paths[1]].spans, [(4, 5), (4, 12), (5, 6)])
+        self.assertEqual(by_path[self.paths[2]].spans, [(0, 1), (0, 1), (0, 1)])
+        for result in results:
+            self.assertEqual(result.errors, 1)
+
+        timings = runner.worker_timings
+        self.assertEqual(sum(t.documents for t in timings.values()), len(self.TEXTS))
+        self.assertLessEqual(len(timings), 2)
+
+    def test_errors(self):
+        # messages of history commands are not errors
+        results = list(CorpusRunner(['z', 'Z', 'e'], processes=1).run(self.directory))
+        self.assertEqual([r.errors for r in results], [0] * len(self.TEXTS))
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'needs /proc/self/fd')
+    def test_documents_closed(self):
+        # a worker does not keep the files of its finished documents open
+        corpus._init_worker('e\nbye\n')
+        corpus._run_document(self.paths[0])
+        open_files = len(os.listdir('/proc/self/fd'))
+        for path in self.paths * 3:
+            corpus._run_document(path)
+        self.assertEqual(len(os.listdir('/proc/self/fd')), open_files)
+
+
+if __name__ == '__main__':
+    unittest.main()
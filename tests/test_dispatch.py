@@ -0,0 +1,44 @@
+import unittest
+
+from mim.commands import AppCommand, NavigationCommand, SelectionCommand
+from mim.dispatch import CommandDispatcher
+from mim.history import CommandHistory
+
+
+class CommandDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        nav_command = NavigationCommand()
+        sel_command = SelectionCommand(nav_command)
+        app_command = AppCommand(CommandHistory())
+        self.commands = [nav_command, sel_command, app_command]
+        self.dispatcher = CommandDispatcher(self.commands)
+
+    def test_resolve(self):
+        command_texts = ['0', '$', 'e', 'tw', 'tW', 't!', 't ', 'v0', 'v$', 've', 'vtw', 'vt!', 'z', 'bye',
+                         '', 'tAa', '0a', 'a$', 'E', '0e', 'T', 'v', 'vv0', 'vz', 'byebye', 'zz', 't',
+                         '/(', 'v/[', '/a(', '/a', 'v/a+']
+
+        # same answer as validating every command in registration order
+        for command_text in command_texts:
+            expected = next((c for c in self.commands if c.validate(command_text)), None)
+            resolved = self.dispatcher.resolve(command_text)
+            self.assertIs(expected, resolved[0] if resolved else None, command_text)
+
+    def test_parsed_command(self):
+        command, match = self.dispatcher.resolve('vtw')
+        self.assertIs(command, self.commands[1])
+        self.assertEqual(match.group(), 'vtw')
+
+    def test_compile(self):
+        # count and motion come from the named groups of the match, as parsed from the text
+        for command_text in ['e', '3e', '12tw', '/a+', '2/a', 'v3e', 'v0', 'z']:
+            command, (handler, arguments) = self.dispatcher.compile(command_text)
+            self.assertEqual(arguments, command.compile(command_text)[1], command_text)
+        _, (_, (_, _, sub_arguments)) = self.dispatcher.compile('v12tw')
+        self.assertEqual(sub_arguments, ('12tw', 12, 'tw'))
+        self.assertIsNone(self.dispatcher.compile('/('))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+import random
+import unittest
+
+from mim.commands import AppCommand
+from mim.history import CommandHistory
+from mim.util import Cursors, TextStatus
+
+
+class CommandHistoryTestCase(unittest.TestCase):
+
+    def _assert_status(self, expected: TextStatus, actual: TextStatus):
+        self.assertIs(expected.current_text, actual.current_text)
+        self.assertEqual(expected.current_command, actual.current_command)
+        self.assertEqual(expected.start_position, actual.start_position)
+        self.assertEqual(expected.end_position, actual.end_position)
+
+    def test_push_pop(self):
+        texts = ['Hello World?  Hello World!', 'Hello Mim!']
+        rnd = random.Random(7)
+        history = CommandHistory()
+        expected = []
+
+        for _ in range(500):
+            if expected and rnd.random() < 0.4:
+                self._assert_status(expected.pop(), history.pop())
+            else:
+                text = texts[0] if rnd.random() < 0.9 else texts[1]
+                status = TextStatus(text, rnd.choice(['0', '$', 'e', 'tw', 've']),
+                                    rnd.randrange(1000), rnd.randrange(1000))
+                expected.append(status)
+                history.append(status)
+            self.assertEqual(len(expected), len(history))
+
+        while expected:
+            self._assert_status(expected.pop(), history.pop())
+        self.assertEqual(history.size, 0)
+        self.assertRaises(IndexError, history.pop)
+
+    def test_memory_ceiling(self):
+        history = CommandHistory(max_bytes=4096)
+        text = 'Hello World?  Hello World!'
+        statuses = [TextStatus(text, 'e', i, i + 1) for i in range(10000)]
+        for status in statuses:
+            history.append(status)
+            self.assertLessEqual(history.size, 4096)
+
+        # the newest entries are kept
+        kept = len(history)
+        self.assertGreater(kept, 8)
+        self.assertLess(kept, 10000)
+        for status in reversed(statuses[-kept:]):
+            self._assert_status(status, history.pop())
+
+    def test_cursors(self):
+        text = 'Hello World?  Hello World!'
+        history = CommandHistory()
+        statuses = [TextStatus(text, 'e', i, i + 1) for i in range(6)]
+        for i in (1, 2, 4):
+            statuses[i] = TextStatus.from_cursors(statuses[i].shared_text, '*to',
+                                                  Cursors.of([i, i + 5, i + 10], [i + 1, i + 6, i + 11]))
+        for status in statuses:
+            history.append(status)
+
+        self.assertEqual([status.cursors for status in history], [status.cursors for status in statuses])
+        for status in reversed(statuses):
+            popped = history.pop()
+            self._assert_status(status, popped)
+            self.assertIs(popped.cursors, status.cursors)
+        self.assertEqual(history.size, 0)
+
+        # cursors are evicted with their entries
+        history = CommandHistory(max_bytes=4096)
+        cursors = Cursors.of(range(0, 80, 2), range(1, 80, 2))
+        for i in range(100):
+            history.append(TextStatus.from_cursors(statuses[0].shared_text, '*to', cursors))
+            self.assertLessEqual(history.size, 4096)
+        self.assertLess(len(history), 100)
+
+    def test_size_independent_of_text(self):
+        sizes = []
+        for length in (10, 1000000):
+            history = CommandHistory()
+            text = 'x' * length
+            for i in range(100):
+                history.append(TextStatus(text, 'e', i, i + 1))
+            sizes.append(history.size)
+        self.assertEqual(sizes[0], sizes[1])
+
+    def test_revert(self):
+        history = CommandHistory()
+        command = AppCommand(history)
+        text = 'Hello World?  Hello World!'
+        history.append(TextStatus(text, None, 0, 0))
+        history.append(TextStatus(text, 'e', 4, 5))
+        history.append(TextStatus(text, '$', 25, 26))
+
+        # the reverted state is kept and redone, the app does not push either
+        reverted = command.execute(TextStatus(text, AppCommand.COMMAND_REVERT, 25, 26))
+        self.assertEqual((reverted.start_position, reverted.end_position), (4, 5))
+        self.assertEqual(len(history), 3)
+        self.assertFalse(command.pushes_history(AppCommand.COMMAND_REVERT))
+        redone = command.execute(TextStatus(text, AppCommand.COMMAND_REDO, 4, 5))
+        self.assertEqual((redone.start_position, redone.end_position, redone.current_command), (25, 26, '$'))
+
+        # nowhere to move, stay
+        self.assertEqual(command.execute(TextStatus(text, AppCommand.COMMAND_REDO, 25, 26)).start_position, 25)
+        for _ in range(3):
+            reverted = command.execute(TextStatus(text, AppCommand.COMMAND_REVERT, 0, 0))
+        self.assertEqual((reverted.start_position, reverted.end_position), (0, 0))
+
+    def test_undo_tree(self):
+        text = 'Hello World?  Hello World!'
+        history = CommandHistory()
+        root, e, dollar, t = (TextStatus(text, None, 0, 0), TextStatus(text, 'e', 4, 5),
+                              TextStatus(text, '$', 25, 26), TextStatus(text, 'tw', 5, 6))
+        history.append(root)
+        history.append(e)
+        history.append(dollar)
+        self._assert_status(e, history.undo())
+        # a new command after an undo starts a branch, the other one is kept
+        history.append(t)
+        self.assertEqual(len(history), 4)
+        self.assertEqual([status.current_command for status in history], [None, 'e', 'tw'])
+
+        self._assert_status(dollar, history.older_branch())
+        self.assertIsNone(history.older_branch())
+        self._assert_status(t, history.newer_branch())
+        self.assertIsNone(history.newer_branch())
+
+        # redo follows the branch last visited
+        self._assert_status(e, history.undo())
+        self._assert_status(t, history.redo())
+        self.assertIsNone(history.redo())
+        history.older_branch()
+        self._assert_status(e, history.undo())
+        self._assert_status(root, history.undo())
+        self.assertIsNone(history.undo())
+        self._assert_status(e, history.redo())
+        self._assert_status(dollar, history.redo())
+
+        # pop discards the current state only
+        self._assert_status(dollar, history.pop())
+        self.assertEqual(len(history), 3)
+        self._assert_status(e, history.current)
+        self.assertIsNone(history.redo())
+
+    def test_random_walk(self):
+        texts = ['Hello World?  Hello World!', 'Hello Mim!']
+        rnd = random.Random(3)
+        # states are kept as whole statuses alongside the tree: (status, parent, children)
+        history = CommandHistory(max_bytes=1 << 30)
+        statuses, parents, children = [], [], []
+        redo = {}
+        current = -1
+        for _ in range(2000):
+            move = rnd.random()
+            if current < 0 or move < 0.4:
+                status = TextStatus(rnd.choice(texts), rnd.choice(['0', '$', 'e', 'tw', 've']),
+                                    rnd.randrange(1000), rnd.randrange(1000))
+                history.append(status)
+                statuses.append(status)
+                parents.append(current)
+                children.append([])
+                if current >= 0:
+                    children[current].append(len(statuses) - 1)
+                    redo[current] = len(statuses) - 1
+                current = len(statuses) - 1
+                continue
+            if move < 0.65:
+                actual, target = history.undo(), parents[current]
+                if target >= 0:
+                    redo[target] = current
+            elif move < 0.85:
+                actual, target = history.redo(), redo.get(current, -1)
+            else:
+                siblings = children[parents[current]] if parents[current] >= 0 else [
+                    i for i, parent in enumerate(parents) if parent < 0]
+                i = siblings.index(current) + (-1 if move < 0.93 else 1)
+                actual = history.older_branch() if move < 0.93 else history.newer_branch()
+                target = siblings[i] if 0 <= i < len(siblings) else -1
+            if target < 0:
+                self.assertIsNone(actual)
+            else:
+                self._assert_status(statuses[target], actual)
+                current = target
+            self._assert_status(statuses[current], history.current)
+
+    def test_pruning(self):
+        text = 'Hello World?  Hello World!'
+        history = CommandHistory(max_bytes=4096)
+        # a long branch, abandoned, then a new one from its start
+        history.append(TextStatus(text, None, 0, 0))
+        for i in range(15):
+            history.append(TextStatus(text, 'e', i, i + 1))
+        for _ in range(15):
+            history.undo()
+        kept = []
+        for i in range(100):
+            status = TextStatus(text, '$', 500 + i, 501 + i)
+            kept.append(status)
+            history.append(status)
+            self.assertLessEqual(history.size, 4096)
+
+        # the oldest states went first, the newest keep their positions
+        self.assertLess(len(history), 100)
+        self.assertIsNone(history.older_branch())
+        path = list(history)
+        self.assertEqual(len(path), len(history))
+        for expected, status in zip(kept[-len(path):], path):
+            self._assert_status(expected, status)
+        for _ in range(len(path) - 1):
+            self.assertIsNotNone(history.undo())
+        self.assertIsNone(history.undo())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import io
+import os
+import tempfile
+import unittest
+
+from journal import Journal, read_journal
+from main import config_app, run_script
+from ui import StreamMimUI
+
+
+class JournalTestCase(unittest.TestCase):
+
+    TEXT = 'Hello World?  Hello World!'
+
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self) -> None:
+        os.remove(self.path)
+
+    def _run(self, script: str, checkpoint_interval: int = Journal.DEFAULT_CHECKPOINT_INTERVAL,
+             input_file: str = None) -> list:
+        output = io.StringIO()
+        with Journal(self.path, sync_interval=0, checkpoint_interval=checkpoint_interval) as journal:
+            run_script(config_app(StreamMimUI(io.StringIO(script), output, io.StringIO()), journal=journal),
+                       input_file=input_file)
+        return output.getvalue().splitlines()
+
+    def _recover(self, commands: str = '') -> list:
+        """
+        recover the journaled session, then run commands on it
+        """
+        output = io.StringIO()
+        with Journal(self.path, sync_interval=0) as journal:
+            mim_app = config_app(StreamMimUI(io.StringIO(commands), output, io.StringIO()), journal=journal)
+            self.assertTrue(mim_app.recover())
+            mim_app.output_current_text_status()
+            command_text = mim_app.input_command()
+            while command_text is not None:
+                if mim_app.get_command(command_text):
+                    mim_app.execute()
+                    mim_app.output_current_text_status()
+                command_text = mim_app.input_command()
+        return output.getvalue().splitlines()
+
+    def test_recover(self):
+        spans = self._run(self.TEXT + '\ne\ne\nv0\nz\nx\n$\n')
+        self.assertEqual(spans, ['4 5', '11 12', '0 12', '11 12', '25 26'])
+
+        # current status, then reverts walk back through the recovered history
+        self.assertEqual(self._recover('z\nz\n'), ['25 26', '11 12', '4 5'])
+        # the recovery above was journaled as well
+        self.assertEqual(self._recover('z\n'), ['4 5', '0 0'])
+
+    def test_undo_tree(self):
+        spans = self._run(self.TEXT + '\ne\ne\nz\n$\nz-\nz\nZ\n')
+        self.assertEqual(spans, ['4 5', '11 12', '4 5', '25 26', '11 12', '4 5', '11 12'])
+
+        # both branches are recovered, with the one last visited
+        self.assertEqual(self._recover('z\nZ\nz+\n'), ['11 12', '4 5', '11 12', '25 26'])
+
+    def test_macro(self):
+        # recording leaves no history entry, and the refused 'z' is not replayed
+        spans = self._run(self.TEXT + '\ne\nqa\ne\nz\nq\n@a\n')
+        self.assertEqual(spans, ['4 5', '4 5', '11 12', '11 12', '11 12', '18 19'])
+        self.assertEqual(self._recover('z\nz\nz\n'), ['18 19', '11 12', '4 5', '0 0'])
+
+    def test_redo_after_checkpoint(self):
+        # the checkpoint holds the path to the current state only, redone states come from the records
+        spans = self._run(self.TEXT + '\ne\ne\nz\nz\nZ\n', checkpoint_interval=2)
+        self.assertEqual(len(read_journal(self.path).checkpoint), 1)
+        self.assertEqual(self._recover('z\n'), [spans[-1], '0 0'])
+
+    def test_checkpoint(self):
+        spans = self._run(self.TEXT + '\ne\ne\ne\nz\ne\ntw\n0\n', checkpoint_interval=3)
+        state = read_journal(self.path)
+        self.assertEqual([entry.command for entry in state.checkpoint], [None, 'e', 'e', 'e', 'tw'])
+        self.assertEqual([entry.command for entry in state.records], ['0'])
+
+        self.assertEqual(self._recover('z\nz\nz\n'), [spans[-1], spans[-2], spans[-3], spans[-4]])
+
+    def test_bounded(self):
+        # a checkpoint rewrites the journal, it does not grow with the number of commands
+        self._run(self.TEXT + '\n' + 'e\nz\n' * 10, checkpoint_interval=4)
+        size = os.path.getsize(self.path)
+        os.remove(self.path)
+        self._run(self.TEXT + '\n' + 'e\nz\n' * 100, checkpoint_interval=4)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        state = read_journal(self.path)
+        self.assertEqual(len(state.texts), 1)
+        self.assertEqual(self._recover('e\n'), ['0 0', '4 5'])
+
+    def test_flushed(self):
+        # every record reaches the file at once, the fsync is left to the timer
+        with Journal(self.path, sync_interval=60) as journal:
+            journal.write_text(self.TEXT)
+            self.assertEqual(read_journal(self.path).texts[0].value, self.TEXT)
+
+    def test_torn_write(self):
+        self._run(self.TEXT + '\ne\ne\n')
+        complete_length = os.path.getsize(self.path)
+        with open(self.path, 'ab') as journal_file:
+            journal_file.write(Journal._header.pack(Journal.RECORD_COMMAND, 100, 0) + b'\x00' * 10)
+
+        state = read_journal(self.path)
+        self.assertEqual(state.valid_length, complete_length)
+        self.assertEqual(len(state.records), 3)
+        # the torn record is dropped and the session continues after the last complete one
+        self.assertEqual(self._recover('e\n'), ['11 12', '18 19'])
+        self.assertEqual(len(read_journal(self.path).records), 4)
+
+    def test_file_text(self):
+        fd, text_path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as text_file:
+            text_file.write(self.TEXT.encode('utf-8'))
+        try:
+            self._run('e\n$\n', input_file=text_path)
+            state = read_journal(self.path)
+            self.assertEqual(state.texts[0].kind, Journal.TEXT_FILE)
+            self.assertEqual(self._recover('z\n'), ['25 26', '4 5'])
+        finally:
+            os.remove(text_path)
+
+    def test_not_a_journal(self):
+        with open(self.path, 'wb') as journal_file:
+            journal_file.write(b'Hello World!')
+        self.assertRaises(ValueError, read_journal, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
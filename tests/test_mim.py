@@ -1,6 +1,14 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
 import unittest
 
-from main import config_app
+from commands import AppCommand
+from main import config_app, main, run_script
+from metrics import Metrics
+from ui import StreamMimUI
 
 
 class MimTestCase(unittest.TestCase):
@@ -13,6 +21,132 @@ class MimTestCase(unittest.TestCase):
         # command_text = Navi
         # self._mim_app.get_command()
 
+    def test_run_script(self):
+        script = io.StringIO('Hello World?  Hello World!\ne\ne\nv0\nz\nx\n$\n')
+        output = io.StringIO()
+        errors = io.StringIO()
+
+        run_script(config_app(StreamMimUI(script, output, errors)))
+
+        self.assertEqual(output.getvalue().splitlines(), ['4 5', '11 12', '0 12', '11 12', '25 26'])
+        self.assertEqual(errors.getvalue().splitlines(), [StreamMimUI.ERROR_COMMAND_NOT_RECOGNIZABLE])
+
+    def test_run_script_with_text(self):
+        script = io.StringIO('tw\ne\nvtw\n')
+        output = io.StringIO()
+
+        run_script(config_app(StreamMimUI(script, output, input_text='Hello World?  Hello World!')))
+
+        self.assertEqual(output.getvalue().splitlines(), ['5 6', '11 12', '11 20'])
+
+    def test_run_script_with_file(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as text_file:
+            text_file.write('Héllo Wörld?  Héllo Wörld!'.encode('utf-8'))
+        script = io.StringIO('e\ntw\n$\n')
+        output = io.StringIO()
+        try:
+            run_script(config_app(StreamMimUI(script, output)), input_file=path)
+        finally:
+            os.remove(path)
+
+        # positions are in characters, not bytes
+        self.assertEqual(output.getvalue().splitlines(), ['4 5', '5 6', '25 26'])
+
+    def test_macro(self):
+        script = io.StringIO('Hello World?  Hello World!\nqa\ne\nx\nz\nvtw\nq\n0\n@a\nz\n2@a\nz\nz\n')
+        output = io.StringIO()
+        errors = io.StringIO()
+
+        run_script(config_app(StreamMimUI(script, output, errors)))
+
+        # 'z' is refused while recording, a playback is reverted as a whole, 'qa' and 'q' leave no history entry
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['0 0', '4 5', '4 5', '4 6', '4 6', '0 1', '4 6', '0 1', '11 20', '0 1', '4 6'])
+        self.assertEqual(errors.getvalue().splitlines()[1], AppCommand.MESSAGE_RECORDING)
+
+    def test_undo_tree(self):
+        script = io.StringIO('Hello World?  Hello World!\ne\ne\nz\nZ\nz\n$\nz-\nz+\nz\nZ\n')
+        output = io.StringIO()
+
+        run_script(config_app(StreamMimUI(script, output, io.StringIO())))
+
+        # '$' after an undo starts a new branch, 'Z' follows the branch last visited
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['4 5', '11 12', '4 5', '11 12', '4 5', '25 26', '11 12', '25 26', '4 5', '25 26'])
+
+    def test_multi_cursor(self):
+        script = io.StringIO('Hello World?  Hello World!\n*to\nve\nz\n/W\n$\n*\nz\nz\n')
+        output = io.StringIO()
+
+        run_script(config_app(StreamMimUI(script, output, io.StringIO())))
+
+        # every cursor moves at once and is reverted at once, cursors on the same character merge
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['3 4 6 7 17 18 20 21', '3 12 6 12 17 26 20 26', '3 4 6 7 17 18 20 21', '6 7 20 21',
+                          '25 26', '25 26', '25 26', '6 7 20 21'])
+
+    def test_metrics(self):
+        script = io.StringIO('Hello World?  Hello World!\ne\nve\nx\n$\n')
+        metrics = Metrics(trace_memory=True)
+        try:
+            run_script(config_app(StreamMimUI(script, io.StringIO(), io.StringIO()), metrics=metrics))
+        finally:
+            metrics.close()
+
+        self.assertEqual(metrics.stats(Metrics.PHASE_DISPATCH, 'NavigationCommand').count, 2)
+        self.assertEqual(metrics.stats(Metrics.PHASE_DISPATCH, 'unrecognized').count, 1)
+        self.assertEqual(metrics.stats(Metrics.PHASE_EXECUTE, 'SelectionCommand').count, 1)
+        self.assertEqual(metrics.stats(Metrics.PHASE_HISTORY_PUSH, 'NavigationCommand').count, 2)
+        self.assertEqual(metrics.stats(Metrics.PHASE_RENDER, 'NavigationCommand').count, 2)
+
+        snapshot = json.loads(json.dumps(metrics.snapshot()))
+        execute = snapshot['phases'][Metrics.PHASE_EXECUTE]['NavigationCommand']
+        self.assertEqual(execute['count'], 2)
+        self.assertEqual(sum(execute['histogram_ns'].values()), 2)
+        self.assertGreaterEqual(execute['max_ns'], execute['mean_ns'])
+
+    def test_headless_messages(self):
+        directory = tempfile.mkdtemp()
+        script_path = os.path.join(directory, 'script')
+        output_path = os.path.join(directory, 'output')
+        with open(script_path, 'w', encoding='utf-8') as script_file:
+            script_file.write('Hello Mim!\nz\ne\nbye\ne\n')
+        errors = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(errors), contextlib.redirect_stdout(io.StringIO()) as stdout:
+                main(['--script', script_path, '--output', output_path])
+            with open(output_path, encoding='utf-8') as output_file:
+                spans = output_file.read().splitlines()
+        finally:
+            for path in (script_path, output_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(directory)
+
+        # messages go to the error stream only, 'bye' ends the script without a farewell
+        self.assertEqual(spans, ['0 0', '4 5'])
+        self.assertEqual(len(errors.getvalue().splitlines()), 1)
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_metrics_file(self):
+        directory = tempfile.mkdtemp()
+        script_path = os.path.join(directory, 'script')
+        metrics_path = os.path.join(directory, 'metrics.json')
+        with open(script_path, 'w', encoding='utf-8') as script_file:
+            script_file.write('Hello Mim!\ne\n')
+        try:
+            main(['--script', script_path, '--output', os.devnull, '--metrics', metrics_path])
+            with open(metrics_path, encoding='utf-8') as metrics_file:
+                snapshot = json.load(metrics_file)
+        finally:
+            for path in (script_path, metrics_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(directory)
+
+        self.assertEqual(snapshot['phases'][Metrics.PHASE_RENDER]['NavigationCommand']['count'], 1)
+
 
 if __name__ == '__main__':
     unittest.main()
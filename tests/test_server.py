@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from server import MimServer
+from ui import MimUI
+
+
+class MimServerTestCase(unittest.TestCase):
+
+    async def _session(self, port: int, lines) -> list:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+        await writer.drain()
+        writer.write_eof()
+        responses = (await reader.read()).decode('utf-8').splitlines()
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    async def _run_sessions(self):
+        mim_server = MimServer()
+        server = await mim_server.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            sessions = [
+                self._session(port, ['Hello World?  Hello World!', 'e', 've', 'x', 'z']),
+                self._session(port, ['Hello Mim!', '$', 'Z', 'bye', '0']),
+                self._session(port, ['abc def', 'e', 'e']),
+            ]
+            responses = await asyncio.gather(*sessions)
+        self.assertEqual(mim_server.sessions, 0)
+        return responses
+
+    def test_sessions(self):
+        responses = asyncio.run(self._run_sessions())
+
+        self.assertEqual(responses[0], ['4 5', '4 12', '# ' + MimUI.ERROR_COMMAND_NOT_RECOGNIZABLE, '4 5'])
+        # messages of AppCommand go to the session, 'bye' closes its own session only
+        self.assertEqual(responses[1], ['9 10', '# Nothing to redo.', '9 10', '# ' + MimServer.MESSAGE_BYE])
+        self.assertEqual(responses[2], ['2 3', '6 7'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import unittest
+
+MIM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'mim')
+
+
+class StartupTestCase(unittest.TestCase):
+
+    # prompt UI dependencies that must not be loaded by the engine modules
+    UI_MODULES = ('PyInquirer', 'prompt_toolkit', 'examples')
+    # generous bound on the cumulative import time of one engine module, in microseconds
+    IMPORT_TIME_BUDGET_US = 250000
+
+    def _import_times(self, modules: str) -> dict:
+        """
+        import modules in a fresh interpreter, return {module: cumulative import time in us}
+        """
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modules}'],
+                                cwd=MIM_DIR, capture_output=True, text=True, check=True)
+        import_times = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            import_times[name.strip()] = int(cumulative)
+        return import_times
+
+    def test_engine_import(self):
+        import_times = self._import_times('util, commands, mim_app, main')
+
+        for name in import_times:
+            self.assertNotIn(name.split('.')[0], self.UI_MODULES)
+        for name in ('util', 'commands', 'mim_app', 'main'):
+            self.assertLess(import_times[name], self.IMPORT_TIME_BUDGET_US, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
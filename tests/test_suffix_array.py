@@ -0,0 +1,82 @@
+import io
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from buffer import PieceTable
+from main import config_app, run_script
+from suffix_array import SuffixArray, SuffixArrayCache
+from ui import StreamMimUI
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class SuffixArrayTestCase(unittest.TestCase):
+
+    def _random_texts(self):
+        rnd = random.Random(3)
+        alphabet = 'aab \né世'
+        texts = [''.join(rnd.choice(alphabet) for _ in range(rnd.randrange(0, 60))) for _ in range(200)]
+        return texts + ['', 'a', 'aaaaaaaa', 'banana', 'Hello World?  Hello World!']
+
+    def test_build(self):
+        for text in self._random_texts():
+            expected = sorted(range(len(text)), key=lambda i: text[i:])
+            self.assertEqual(SuffixArray.build(text).suffixes.tolist(), expected, text)
+
+    def test_build_chunks(self):
+        # built from the chunks of a buffer, as from the whole text
+        text = PieceTable('Hello World!').insert(6, 'Mim and ').delete(0, 1)
+        expected = sorted(range(len(text)), key=lambda i: str(text)[i:])
+        self.assertEqual(SuffixArray.build(text).suffixes.tolist(), expected)
+
+    def test_find(self):
+        for text in self._random_texts():
+            suffix_array = SuffixArray.build(text)
+            for literal in ('a', 'aa', 'ab', 'b a', '世', 'x'):
+                for start_pos in range(len(text) + 1):
+                    for count in (1, 2):
+                        expected = text.find(literal, start_pos)
+                        if count == 2 and expected >= 0:
+                            expected = text.find(literal, expected + 1)
+                        self.assertEqual(suffix_array.find(literal, start_pos, count), expected,
+                                         (text, literal, start_pos, count))
+
+    def test_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = SuffixArrayCache(directory)
+            text = 'Hello World?  Hello World!'
+            built = cache.get(text)
+            self.assertTrue(os.path.exists(cache.path(text)))
+            # an equal text, another object, is found by its content
+            loaded = cache.get(''.join(text))
+            self.assertEqual(loaded.suffixes.tolist(), built.suffixes.tolist())
+            self.assertEqual(loaded.find('World', 7), 20)
+            self.assertNotEqual(cache.path(text), cache.path(text + ' '))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_search(self):
+        script = 'Hello World?  Hello World!\n/World\nn\nv/Hel\n0\n/o W\n/W.r\n*te\n/o\n'
+        directory = tempfile.mkdtemp()
+        try:
+            outputs = []
+            for suffix_arrays in (None, SuffixArrayCache(directory)):
+                output = io.StringIO()
+                run_script(config_app(StreamMimUI(io.StringIO(script), output), suffix_arrays=suffix_arrays))
+                outputs.append(output.getvalue().splitlines())
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(outputs[0], ['6 7', '20 21', '20 22', '0 1', '4 5', '6 7', '0 1 14 15', '4 5 18 19'])
+        self.assertEqual(outputs[1], outputs[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import gc
+import unittest
+import weakref
+
+from mim.shared_text import get_text_index, intern_text
+from mim.text_index import TextIndex
+
+
+class TextIndexTestCase(unittest.TestCase):
+
+    def test_find_char(self):
+        # 01234567890123456789012345
+        # Hello World?  Hello World!
+        index = TextIndex('Hello World?  Hello World!')
+
+        self.assertEqual(index.find_char('w', 0), 6)
+        self.assertEqual(index.find_char('W', 7), 20)
+        self.assertEqual(index.find_char('h', 1), 14)
+        self.assertEqual(index.find_char('!', 0), 25)
+        self.assertEqual(index.find_char('!', 26), -1)
+        self.assertEqual(index.find_char('x', 0), -1)
+
+    def test_char_positions_on_lookup(self):
+        # 'k', 'K' and the Kelvin sign all lowercase to 'k'
+        index = TextIndex('kK\u212a x Kk')
+        self.assertEqual(index._char_positions, {})
+        self.assertEqual(list(index.char_positions('K')), [0, 1, 2, 6, 7])
+        self.assertEqual(index.find_char('k', 3), 6)
+        self.assertEqual(index.find_char('x', 0, 2), -1)
+        self.assertEqual(sorted(index._char_positions), ['k', 'x'])
+
+    def test_find_word_end(self):
+        # offsets: 'Hello' 0-4, 'World?' 6-11, '\t' 12, 'Hello' 14-18, 'World!' 20-25
+        index = TextIndex('Hello World?\t Hello World!  ')
+
+        self.assertEqual(index.find_word_end(0), 5)
+        self.assertEqual(index.find_word_end(5), 12)
+        self.assertEqual(index.find_word_end(12), 19)
+        self.assertEqual(index.find_word_end(21), 26)
+        self.assertEqual(index.find_word_end(26), -1)
+
+    def test_lines(self):
+        # lines: 'ab' 0-1, '' 3, 'cde' 4-6; the final newline ends the last line
+        index = TextIndex('ab\n\ncde\n')
+
+        self.assertEqual([index.line_of(pos) for pos in range(9)], [0, 0, 0, 1, 2, 2, 2, 2, 2])
+        self.assertEqual([index.line_start(line) for line in range(4)], [0, 3, 4, 4])
+        self.assertEqual([index.line_end(line) for line in range(4)], [2, 3, 7, 7])
+        self.assertEqual(index.line_count(), 3)
+        self.assertEqual(index.line_column(6), (2, 2))
+        self.assertEqual(index.offset(2, 1), 5)
+        # clamped to the line, and to the last line
+        self.assertEqual(index.offset(0, 10), 2)
+        self.assertEqual(index.line_start(10), 4)
+        self.assertEqual(TextIndex('\n').line_count(), 1)
+        self.assertEqual(TextIndex('').line_count(), 1)
+
+    def test_lines_incremental(self):
+        index = TextIndex('x\n' * 10)
+        self.assertEqual(index.line_start(2), 4)
+        self.assertEqual(index.line_count(), 10)
+        self.assertEqual(index.line_of(19), 9)
+
+    def test_rebuild_on_text_change(self):
+        text = 'abc'
+        shared_text = intern_text(text)
+        index = get_text_index(text)
+        self.assertIs(index, get_text_index(text))
+        self.assertIs(index, shared_text.index)
+
+        new_text = 'xyz'
+        self.assertIsNot(index, get_text_index(new_text))
+        self.assertEqual(get_text_index(new_text).find_char('z', 0), 2)
+
+    def test_not_pinned(self):
+        # the last interned text is not kept alive once nothing references it
+        shared_text_ref = weakref.ref(intern_text('abc' * 3))
+        gc.collect()
+        self.assertIsNone(shared_text_ref())
+
+
+if __name__ == '__main__':
+    unittest.main()
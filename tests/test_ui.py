@@ -43,6 +43,43 @@ class UITestCase(unittest.TestCase):
         self.assertEqual(self._ui.output_text(output_text, start_pos, end_pos),
                          "This is a test.")
 
+    def test_output_viewport(self):
+        ui = SimpleMimUI(viewport=3)
+
+        output_text = 'This is a test.'
+        self.assertEqual(ui.output_text(output_text), 'Thi...')
+        self.assertEqual(ui.output_text(output_text, 5, 7), '...is [is] a ...')
+        self.assertEqual(ui.output_text(output_text, 0, 1), '[T]his...')
+        self.assertEqual(ui.output_text(output_text, 14, 15), '...est[.]')
+
+        # long selections keep their ends only
+        self.assertEqual(ui.output_text(output_text, 0, len(output_text)), '[Thi...st.]')
+        self.assertEqual(ui.output_text(output_text, 1, 9), 'T[his...s a] te...')
+
+    def test_output_spans(self):
+        ui = SimpleMimUI(viewport=2)
+
+        output_text = 'This is a longer test.'
+        # gaps up to twice the viewport are kept
+        self.assertEqual(ui.output_text(output_text, 0, 1, [(0, 1), (5, 7), (20, 21)]),
+                         '[T]his [is] a...es[t].')
+        # overlapping spans are shown from the end of the previous one
+        self.assertEqual(ui.output_text(output_text, 2, 4, [(2, 4), (3, 6), (8, 9)]), 'Th[is][ i]s [a] l...')
+        self.assertEqual(ui.output_text(output_text, 8, 8, [(8, 8), (10, 16)]), '...s a [lo...er] t...')
+
+    def test_input_max_length(self):
+        validator = SimpleMimUI.InputTextValidator()
+        self.assertTrue(validator('a' * 30))
+        self.assertNotEqual(validator('a' * 31), True)
+        self.assertNotEqual(validator(''), True)
+
+        ui = SimpleMimUI(input_max_length=100)
+        validator = ui.input_question[0]['validate']
+        self.assertTrue(validator('a' * 100))
+        self.assertNotEqual(validator('a' * 101), True)
+        # the class default is left untouched
+        self.assertIsNot(ui.input_question, SimpleMimUI.input_question)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from mim.util import LRUCache, TextStatus, TextStatusArray
+
+
+class TextStatusTestCase(unittest.TestCase):
+
+    def test_text_status(self):
+        text_status = TextStatus('Hello World!', 'e')
+        self.assertEqual(text_status.start_position, -1)
+        self.assertEqual(text_status.end_position, -1)
+
+        text_status.start_position = 4
+        text_status.end_position = 5
+        self.assertEqual((text_status.start_position, text_status.end_position), (4, 5))
+
+        # slotted, no per-instance dict
+        self.assertRaises(AttributeError, setattr, text_status, 'position', 0)
+
+    def test_shared_text(self):
+        text = 'Hello World?  Hello World!'
+        text_status = TextStatus(text, 'e', 4, 5)
+        other = TextStatus(text, '$', 25, 26)
+        self.assertIs(text_status.shared_text, other.shared_text)
+        self.assertEqual(text_status.generation, other.generation)
+
+        # reassigning the same text keeps the generation, another text gets a new one
+        generation = text_status.generation
+        text_status.current_text = text
+        self.assertEqual(text_status.generation, generation)
+        text_status.current_text = 'Hello Mim!'
+        self.assertEqual(text_status.current_text, 'Hello Mim!')
+        self.assertGreater(text_status.generation, generation)
+        self.assertEqual(other.generation, generation)
+
+        copy = TextStatus.from_shared(other.shared_text, 'e', 4, 5)
+        self.assertIs(copy.current_text, text)
+        self.assertEqual(copy.generation, generation)
+
+    def test_text_status_array(self):
+        text = 'Hello World?  Hello World!'
+        statuses = TextStatusArray(text)
+        statuses.append(TextStatus(text, 'e', 4, 5))
+        statuses.append(TextStatus(text, '$', 25, 26))
+        statuses.append_positions(4, 5, 'e')
+        self.assertEqual(len(statuses), 3)
+
+        text_status = statuses[1]
+        self.assertIs(text_status.current_text, text)
+        self.assertEqual(text_status.current_command, '$')
+        self.assertEqual((text_status.start_position, text_status.end_position), (25, 26))
+        self.assertEqual(list(statuses.start_positions), [4, 25, 4])
+
+        text_status = statuses.pop()
+        self.assertEqual((text_status.current_command, text_status.start_position), ('e', 4))
+        self.assertEqual(len(statuses), 2)
+
+        self.assertRaises(ValueError, statuses.append, TextStatus('Hello Mim!', 'e', 4, 5))
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        # 'b' is the least recently used entry now
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+        self.assertRaises(ValueError, LRUCache, -1)
+
+
+if __name__ == '__main__':
+    unittest.main()